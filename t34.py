@@ -4,8 +4,12 @@
 """
 
 import argparse
+import json
 import sys
 import logging
+from t34 import Batch
+from t34 import Cache
+from t34 import Coverage
 from t34 import Emulator
 from t34 import Memory
 from t34 import Instructions
@@ -23,6 +27,112 @@ def parse_args():
                         nargs='?',
                         help="name of the object file for the program")
 
+    parser.add_argument("--load-address",
+                        "-a",
+                        type=lambda address: int(address, 16),
+                        default=0,
+                        help="HEX address to load raw .bin programs at")
+
+    parser.add_argument("--cache-dir",
+                        default=None,
+                        help="directory to cache decoded programs in between runs")
+
+    parser.add_argument("--script",
+                        "-s",
+                        default=None,
+                        help="file of monitor commands to run without prompting, - for stdin")
+
+    parser.add_argument("--run",
+                        default=None,
+                        metavar="ADDR",
+                        help="HEX address to run the program from, then exit")
+
+    parser.add_argument("--max-steps",
+                        type=int,
+                        default=None,
+                        metavar="N",
+                        help="stop the run after N instructions")
+
+    parser.add_argument("--max-cycles",
+                        type=int,
+                        default=None,
+                        metavar="N",
+                        help="stop the run after N cycles")
+
+    parser.add_argument("--until",
+                        type=lambda address: int(address, 16),
+                        default=None,
+                        metavar="ADDR",
+                        help="stop the run when it reaches HEX address ADDR")
+
+    parser.add_argument("--timeout",
+                        type=float,
+                        default=None,
+                        metavar="SECONDS",
+                        help="stop the run after SECONDS of wall-clock time")
+
+    parser.add_argument("--no-trace",
+                        action="store_true",
+                        default=False,
+                        help="do not output the trace of the run")
+
+    parser.add_argument("--flight-recorder",
+                        type=int,
+                        default=0,
+                        metavar="N",
+                        help="keep the last N trace records and print them to stderr when a run fails or stops")
+
+    parser.add_argument("--coverage",
+                        default=None,
+                        metavar="PATH",
+                        help="merge the addresses executed by the run into the coverage bitmap PATH")
+
+    parser.add_argument("--profile",
+                        default=None,
+                        metavar="PATH",
+                        help="write the subroutine profile of the run to PATH as folded stacks")
+
+    parser.add_argument("--profile-unit",
+                        choices=("cycles", "steps"),
+                        default="cycles",
+                        help="count cycles or instructions in the --profile output")
+
+    parser.add_argument("--symbols",
+                        default=None,
+                        metavar="PATH",
+                        help="name addresses in traces, profiles and the monitor by the labels in PATH")
+
+    parser.add_argument("--trace-file",
+                        default=None,
+                        metavar="PATH",
+                        help="write the trace of the run to PATH instead of stdout")
+
+    parser.add_argument("--dump",
+                        action="append",
+                        default=[],
+                        metavar="START.END",
+                        help="print a HEX memory range after the run, then exit")
+
+    parser.add_argument("--state-out",
+                        default=None,
+                        metavar="PATH",
+                        help="write the registers after the run to PATH as JSON, then exit")
+
+    parser.add_argument("--batch",
+                        default=None,
+                        metavar="FILE",
+                        help="run every 'program ADDR [ADDR:BYTES ...]' line of FILE in a process pool")
+
+    parser.add_argument("--workers",
+                        type=int,
+                        default=None,
+                        help="number of worker processes for --batch")
+
+    parser.add_argument("--digest",
+                        action="store_true",
+                        default=False,
+                        help="include a digest of the final memory in --batch results")
+
     parser.add_argument("--debug",
                         "-d",
                         action="store_true",
@@ -32,6 +142,59 @@ def parse_args():
     return parser.parse_args()
 
 
+def run_headless(em, args, out):
+    """
+        **Headless Run**
+
+        Runs the program and writes the requested dumps and state without starting the monitor.
+
+        :param em: emulator with the program loaded.
+        :param args: command line arguments.
+        :param out: writer for the trace and dumps.
+    """
+    if args.run is not None:
+        limits = {"max_steps": args.max_steps, "max_cycles": args.max_cycles,
+                  "until_pc": args.until, "timeout": args.timeout}
+        if args.no_trace:
+            em.run_program(args.run, trace=False, **limits)
+        elif args.trace_file is not None:
+            with open(args.trace_file, "w", buffering=1 << 16) as trace:
+                em.run_program(args.run, out=trace, **limits)
+        else:
+            em.run_program(args.run, out=out, **limits)
+
+    for dump in args.dump:
+        begin, _, end = dump.partition(".")
+        em.dump_memory_range(begin, end or begin, out)
+
+    if args.state_out is not None:
+        state = em.get_registers()
+        if em.stop is not None:
+            state.update(em.stop._asdict())
+        with open(args.state_out, "w") as state_file:
+            json.dump(state, state_file)
+
+
+def run_batch(args, out):
+    """
+        **Batch Run**
+
+        Runs every task of the batch file across a process pool and writes one JSON line per result.
+
+        :param args: command line arguments.
+        :param out: writer for the results.
+    """
+    with open(args.batch) as batch_file:
+        tasks = [task for task in map(Batch.parse_task, batch_file) if task is not None]
+    results = Batch.run_batch(tasks, args.workers, digest=args.digest,
+                              max_steps=args.max_steps, max_cycles=args.max_cycles,
+                              until_pc=args.until, timeout=args.timeout)
+    for result in results:
+        record = result._asdict()
+        record["registers"] = result.registers.hex().upper()
+        out.write(json.dumps(record) + "\n")
+
+
 def main(args):
     """
         **Main**
@@ -43,8 +206,43 @@ def main(args):
     if args.debug is True:
         logging.basicConfig(stream=sys.stderr, level=logging.DEBUG)
     logging.debug(args)
-    em = Emulator.Emulator(args.program_name)
-    em.start_emulator()
+    if args.cache_dir is not None:
+        Cache.shared = Cache.ProgramCache(args.cache_dir)
+    if args.batch is not None:
+        sys.stdout.flush()
+        with open(sys.stdout.fileno(), "w", buffering=1 << 16, closefd=False) as out:
+            run_batch(args, out)
+        return
+    em = Emulator.Emulator(args.program_name, args.load_address)
+    if args.symbols is not None:
+        em.load_symbols(args.symbols)
+    if args.flight_recorder:
+        em.record_flight(args.flight_recorder)
+    if args.coverage is not None:
+        em.record_coverage()
+    if args.profile is not None:
+        em.record_profile(args.profile_unit)
+    headless = args.run is not None or args.dump or args.state_out is not None
+    script = args.script
+    if script is None and not headless and not sys.stdin.isatty():
+        script = "-"
+    if script is None and not headless:
+        em.start_emulator()
+    else:
+        sys.stdout.flush()
+        with open(sys.stdout.fileno(), "w", buffering=1 << 16, closefd=False) as out:
+            if headless:
+                run_headless(em, args, out)
+            elif script == "-":
+                em.run_script(sys.stdin, out)
+            else:
+                with open(script) as commands:
+                    em.run_script(commands, out)
+    if args.coverage is not None and em.coverage is not None:
+        Coverage.save(args.coverage, em.coverage, merge_existing=True)
+    if args.profile is not None and em.profiler is not None:
+        with open(args.profile, "w") as folded:
+            folded.writelines(em.profiler.folded(em.symbols and em.symbols.name))
 
 
 if __name__ == "__main__":
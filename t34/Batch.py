@@ -0,0 +1,106 @@
+"""
+.. module:: Batch
+    :synopsis: Runs many independent T34 programs across a pool of worker processes.
+"""
+import hashlib
+import logging
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from . import Emulator
+logger = logging.getLogger(__name__)
+
+Task = namedtuple("Task", ["program", "start", "patches"], defaults=((),))
+
+BatchResult = namedtuple("BatchResult", ["program", "start", "reason", "steps", "cycles",
+                                         "registers", "digest", "error"], defaults=(None,))
+
+_emulator = None
+_options = None
+
+
+def _initialize(options):
+    """
+    Creates the emulator a worker process reuses for all of its tasks.
+
+    :param dict options: limits for every run and whether to digest memory.
+    """
+    global _emulator, _options
+    _emulator = Emulator.Emulator()
+    _options = options
+
+
+def run_task(task, emulator=None, options=None):
+    """
+    Loads a program into a clean emulator, applies its patches and runs it without a trace.
+    A task that raises, while loading or running, ends with reason ``error`` and the exception
+    in ``error`` rather than failing the whole batch; its start is None if it is not a HEX
+    address.
+
+    :param Task task: program, start address and (address, bytes) memory patches.
+    :param Emulator emulator: emulator to reuse, defaults to the worker's emulator.
+    :param dict options: limits for the run and ``digest``, defaults to the worker's options.
+
+    :return: final state of the run.
+    :rtype: BatchResult
+    """
+    em = _emulator if emulator is None else emulator
+    options = _options if options is None else options
+    limits = dict(options)
+    digest = limits.pop("digest", False)
+
+    em.reset()
+    start = None
+    error = None
+    try:
+        start = task.start if isinstance(task.start, int) else int(task.start, 16)
+        if task.program is not None:
+            em.program = task.program
+            em.load_program()
+        for address, data in task.patches:
+            em.write_memory(address, data)
+        result = em.run(start, **limits)
+    except Exception as exception:
+        error = "%s: %s" % (type(exception).__name__, exception)
+        result = em.stop or Emulator.RunResult(Emulator.ERROR, 0, 0, start)
+    return BatchResult(task.program, start, result.reason, result.steps, result.cycles,
+                       bytes(em.registers[:7]),
+                       hashlib.blake2b(em.memory, digest_size=16).hexdigest() if digest else None,
+                       error)
+
+
+def run_batch(tasks, workers=None, chunksize=16, digest=False, **limits):
+    """
+    Fans tasks out across a process pool. Each worker keeps one emulator for all of its tasks.
+
+    :param tasks: iterable of :class:`Task`.
+    :param int workers: number of worker processes, defaults to the number of CPUs.
+    :param int chunksize: number of tasks handed to a worker at a time.
+    :param bool digest: include a digest of the final memory in every result.
+    :param limits: ``max_steps``, ``max_cycles``, ``until_pc`` or ``timeout`` for every run.
+
+    :return: one result per task, in the order of the tasks.
+    :rtype: list
+    """
+    options = dict(limits, digest=digest)
+    with ProcessPoolExecutor(workers, initializer=_initialize, initargs=(options,)) as pool:
+        return list(pool.map(run_task, tasks, chunksize=chunksize))
+
+
+def parse_task(line):
+    """
+    Parses a line of a batch file: a program, a HEX start address and any number of
+    ``ADDR:BYTES`` patches, such as ``code3_1.obj 300 1000:0102``.
+
+    :param str line: line of the batch file.
+
+    :return: the task, or None for blank lines and comments.
+    :rtype: Task
+    """
+    fields = line.split()
+    if not fields or fields[0].startswith("#"):
+        return None
+    patches = []
+    for patch in fields[2:]:
+        address, _, data = patch.partition(":")
+        patches.append((int(address, 16), bytes.fromhex(data)))
+    return Task(None if fields[0] == "-" else fields[0], fields[1], tuple(patches))
@@ -0,0 +1,235 @@
+"""
+.. module:: Cache
+    :synopsis: Cache of decoded program images keyed by the program's content hash.
+"""
+import collections
+import hashlib
+import logging
+import os
+import struct
+from . import Loader
+logger = logging.getLogger(__name__)
+
+SEGMENT = struct.Struct("<II")
+
+
+class Image:
+    """Scratch memory that records which ranges a loader writes."""
+
+    def __init__(self):
+        """Creates an empty image."""
+        self.memory = bytearray(65536)
+        self.ranges = []
+
+    def mark_dirty(self, start, end):
+        """
+        Records a range written by a loader, merging it with the previous range when they touch.
+
+        :param int start: first address written.
+        :param int end: address one past the last byte written.
+        """
+        if start >= end:
+            return
+        if self.ranges and self.ranges[-1][1] == start:
+            self.ranges[-1][1] = end
+        else:
+            self.ranges.append([start, end])
+
+    def segments(self):
+        """
+        Collects the written ranges as immutable segments.
+
+        :return: (address, data) for every written range.
+        :rtype: tuple
+        """
+        view = memoryview(self.memory)
+        return tuple((start, bytes(view[start:end])) for start, end in self.ranges)
+
+
+class ProgramCache:
+    """LRU cache of decoded program images, optionally backed by a directory on disk."""
+
+    def __init__(self, directory=None, max_bytes=4 << 20, max_disk_bytes=64 << 20):
+        """
+        Creates an empty cache.
+
+        :param str directory: directory for decoded images shared between processes, or None.
+        :param int max_bytes: cap on the image bytes held in this process.
+        :param int max_disk_bytes: cap on the image bytes kept in ``directory``.
+        """
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.max_disk_bytes = max_disk_bytes
+        self.images = collections.OrderedDict()
+        self.files = {}
+        self.size = 0
+        if directory is not None:
+            os.makedirs(directory, exist_ok=True)
+
+    def load(self, memory, path, address=0):
+        """
+        Loads a program into memory, decoding it only if no cached image matches its contents.
+
+        A file whose mtime and size are unchanged since the last load reuses the previous hash
+        without reading the file again.
+
+        :param Memory memory: memory the program is loaded into.
+        :param str path: name of the program file.
+        :param int address: load address for raw binary images.
+        """
+        key = (os.path.abspath(path), address)
+        stat = os.stat(path)
+        known = self.files.get(key)
+        if known is not None and known[0] == stat.st_mtime_ns and known[1] == stat.st_size:
+            digest = known[2]
+        else:
+            digest = self.digest(path, address)
+            self.files[key] = (stat.st_mtime_ns, stat.st_size, digest)
+
+        segments = self.get(digest)
+        if segments is None:
+            logger.debug("Decoding " + path)
+            image = Image()
+            Loader.load(image, path, address)
+            segments = image.segments()
+            self.put(digest, segments)
+            self.save(digest, segments)
+
+        for start, data in segments:
+            memory.memory[start:start+len(data)] = data
+            memory.mark_dirty(start, start+len(data))
+
+    def digest(self, path, address):
+        """
+        Hashes the contents of a program together with the way it is loaded.
+
+        :param str path: name of the program file.
+        :param int address: load address for raw binary images.
+
+        :return: hex digest identifying the decoded image.
+        :rtype: string
+        """
+        content = hashlib.sha256()
+        content.update(os.path.splitext(path)[1].lower().encode())
+        content.update(address.to_bytes(4, byteorder="little"))
+        with open(path, "rb") as program:
+            for chunk in iter(lambda: program.read(1 << 16), b""):
+                content.update(chunk)
+        return content.hexdigest()
+
+    def get(self, digest):
+        """
+        Finds a decoded image in this process or, failing that, on disk.
+
+        :param str digest: hash of the program.
+
+        :return: the image's segments or None.
+        :rtype: tuple
+        """
+        segments = self.images.get(digest)
+        if segments is not None:
+            self.images.move_to_end(digest)
+            return segments
+
+        segments = self.read(digest)
+        if segments is not None:
+            self.put(digest, segments)
+        return segments
+
+    def put(self, digest, segments):
+        """
+        Adds a decoded image to this process' cache, evicting the least recently used images.
+
+        :param str digest: hash of the program.
+        :param tuple segments: (address, data) for every loaded range.
+        """
+        self.images[digest] = segments
+        self.size += image_size(segments)
+        while self.size > self.max_bytes and len(self.images) > 1:
+            _, evicted = self.images.popitem(last=False)
+            self.size -= image_size(evicted)
+
+    def clear(self):
+        """Empties the in-process cache. Images on disk are kept."""
+        self.images.clear()
+        self.files.clear()
+        self.size = 0
+
+    def read(self, digest):
+        """
+        Reads a decoded image from the cache directory.
+
+        :param str digest: hash of the program.
+
+        :return: the image's segments or None.
+        :rtype: tuple
+        """
+        if self.directory is None:
+            return None
+        path = os.path.join(self.directory, digest + ".img")
+        try:
+            with open(path, "rb") as cached:
+                data = cached.read()
+            os.utime(path)
+        except OSError:
+            return None
+
+        segments = []
+        view = memoryview(data)
+        offset = 0
+        while offset < len(data):
+            start, length = SEGMENT.unpack_from(data, offset)
+            offset += SEGMENT.size
+            segments.append((start, bytes(view[offset:offset+length])))
+            offset += length
+        return tuple(segments)
+
+    def save(self, digest, segments):
+        """
+        Writes a decoded image to the cache directory and trims the directory to its cap.
+
+        :param str digest: hash of the program.
+        :param tuple segments: (address, data) for every loaded range.
+        """
+        if self.directory is None:
+            return
+        path = os.path.join(self.directory, digest + ".img")
+        temporary = "%s.%d.tmp" % (path, os.getpid())
+        with open(temporary, "wb") as cached:
+            for start, data in segments:
+                cached.write(SEGMENT.pack(start, len(data)))
+                cached.write(data)
+        os.replace(temporary, path)
+        self.trim()
+
+    def trim(self):
+        """Deletes the least recently used images on disk until the directory fits its cap."""
+        entries = []
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith(".img"):
+                stat = entry.stat()
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_disk_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            total -= size
+
+
+def image_size(segments):
+    """
+    Counts the bytes held by an image.
+
+    :param tuple segments: (address, data) for every loaded range.
+
+    :return: number of bytes.
+    :rtype: int
+    """
+    return sum(len(data) for _, data in segments)
+
+
+shared = ProgramCache()
@@ -0,0 +1,68 @@
+"""
+.. module:: Condition
+    :synopsis: Compiles breakpoint conditions such as ``A == 0x10 and mem[0x07] > 3``.
+
+A condition is a Python expression over the registers ``A`` (or ``AC``), ``X``, ``Y``,
+``SP``, ``SR`` and ``PC``, the status flags ``N``, ``V``, ``B``, ``D``, ``I``, ``Z`` and
+``C``, and memory as ``mem[address]``. Only arithmetic, bitwise, comparison and boolean
+operators on integers are allowed. It is parsed and checked once and turned into a single
+function, so evaluating it costs one call.
+"""
+import ast
+import logging
+logger = logging.getLogger(__name__)
+
+REGISTERS = {"A": "r[2]", "AC": "r[2]", "X": "r[3]", "Y": "r[4]", "SP": "r[5]", "SR": "r[6]",
+             "P": "r[6]", "PC": "pc"}
+
+FLAGS = {"N": 7, "V": 6, "B": 4, "D": 3, "I": 2, "Z": 1, "C": 0}
+
+ALLOWED = (ast.Expression, ast.BoolOp, ast.And, ast.Or, ast.UnaryOp, ast.Not, ast.USub,
+           ast.Invert, ast.BinOp, ast.Add, ast.Sub, ast.Mult, ast.FloorDiv, ast.Mod,
+           ast.BitAnd, ast.BitOr, ast.BitXor, ast.LShift, ast.RShift, ast.Compare, ast.Eq,
+           ast.NotEq, ast.Lt, ast.LtE, ast.Gt, ast.GtE, ast.Constant, ast.Name, ast.Subscript,
+           ast.Load)
+
+
+class _Rewrite(ast.NodeTransformer):
+    """Replaces register, flag and memory names with reads of the machine state."""
+
+    def visit_Name(self, node):
+        name = node.id.upper()
+        if name in REGISTERS:
+            return ast.parse(REGISTERS[name], mode="eval").body
+        if name in FLAGS:
+            return ast.parse("(r[6] >> %d & 1)" % FLAGS[name], mode="eval").body
+        raise ValueError("unknown name in condition: %s" % node.id)
+
+    def visit_Subscript(self, node):
+        if not isinstance(node.value, ast.Name) or node.value.id.lower() != "mem":
+            raise ValueError("only mem[...] can be indexed in a condition")
+        index = self.visit(node.slice)
+        return ast.parse("m[(%s) & 0xFFFF]" % ast.unparse(index), mode="eval").body
+
+
+def compile_condition(source):
+    """
+    Parses a condition and compiles it into a function of the machine state.
+
+    :param str source: the condition, such as ``A == 0x10 and mem[0x07] > 3``.
+
+    :return: function taking the address of the next instruction, the registers and the
+        memory and returning a true value when the condition holds.
+    :rtype: function
+
+    :raises ValueError: if the condition is not a valid expression over the machine state.
+    """
+    try:
+        tree = ast.parse(source.strip(), mode="eval")
+    except SyntaxError:
+        raise ValueError("condition is not an expression: %s" % source)
+    for node in ast.walk(tree):
+        if not isinstance(node, ALLOWED):
+            raise ValueError("%s is not allowed in a condition" % type(node).__name__)
+        if isinstance(node, ast.Constant) and type(node.value) not in (int, bool):
+            raise ValueError("only integers are allowed in a condition")
+
+    body = _Rewrite().visit(tree.body)
+    return eval("lambda pc, r, m: %s" % ast.unparse(body), {"__builtins__": {}})
@@ -0,0 +1,128 @@
+"""
+.. module:: Coverage
+    :synopsis: Execution coverage bitmaps: saving, merging and reporting them.
+
+A coverage bitmap is 65536 bytes, one per address, set to 1 where an instruction was executed.
+"""
+import logging
+import os
+from . import Recorder
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+logger = logging.getLogger(__name__)
+
+SIZE = 65536
+
+
+def merge(bitmaps):
+    """
+    Combines coverage from many runs or processes with a bitwise OR.
+
+    :param bitmaps: iterable of coverage bitmaps.
+
+    :return: addresses executed in any of the runs.
+    :rtype: bytes
+    """
+    total = 0
+    for bitmap in bitmaps:
+        total |= int.from_bytes(bitmap, byteorder="big")
+    return total.to_bytes(SIZE, byteorder="big")
+
+
+def load(path):
+    """
+    Reads a coverage bitmap.
+
+    :param str path: name of the coverage file.
+
+    :return: the bitmap.
+    :rtype: bytes
+
+    :raises ValueError: if the file is not a coverage bitmap.
+    """
+    with open(path, "rb") as coverage_file:
+        bitmap = coverage_file.read()
+    if len(bitmap) != SIZE:
+        raise ValueError("%s: coverage must be %d bytes" % (path, SIZE))
+    return bitmap
+
+
+def save(path, bitmap, merge_existing=False):
+    """
+    Writes a coverage bitmap, replacing the file in a single rename.
+
+    When merging, an exclusive lock on ``PATH.lock`` is held from reading the file until it
+    is replaced, so processes merging into the same file at once do not lose each other's
+    coverage. Where ``fcntl`` is not available the merge is not locked.
+
+    :param str path: name of the coverage file.
+    :param bitmap: coverage to write.
+    :param bool merge_existing: OR the coverage already in the file into it first.
+    """
+    if not merge_existing:
+        _replace(path, bitmap)
+        return
+    with open(path + ".lock", "a") as lock:
+        if fcntl is not None:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            if os.path.exists(path):
+                bitmap = merge((load(path), bitmap))
+            _replace(path, bitmap)
+        finally:
+            if fcntl is not None:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+def _replace(path, bitmap):
+    """Writes a bitmap to a temporary file and renames it over the coverage file."""
+    temporary = "%s.%d.tmp" % (path, os.getpid())
+    with open(temporary, "wb") as coverage_file:
+        coverage_file.write(bitmap)
+    os.replace(temporary, path)
+
+
+def report(bitmap, ranges, memory):
+    """
+    Counts the instructions executed in every range and the bytes they cover.
+
+    :param bitmap: coverage bitmap.
+    :param list ranges: (start, end) for every range, end exclusive.
+    :param memory: memory image the instruction lengths are read from.
+
+    :return: (start, end, instructions, covered bytes) for every range.
+    :rtype: list
+    """
+    lengths = bytes(Recorder.DECODE[op][2] + 1 if op in Recorder.DECODE else 1
+                    for op in range(256))
+    rows = []
+    for start, end in ranges:
+        covered = bytearray(end - start)
+        instructions = 0
+        address = bitmap.find(1, start, end)
+        while address != -1:
+            instructions += 1
+            offset = address - start
+            covered[offset:offset + lengths[memory[address]]] = \
+                b"\1" * min(lengths[memory[address]], end - address)
+            address = bitmap.find(1, address + 1, end)
+        rows.append((start, end, instructions, covered.count(1)))
+    return rows
+
+
+def format_report(rows):
+    """
+    Formats coverage rows as one line per range.
+
+    :param list rows: rows from :func:`report`.
+
+    :return out: lines such as ``300.30F  5 instructions, 12 of 16 bytes (75.0%)``.
+    :rtype: string
+    """
+    output = ""
+    for start, end, instructions, covered in rows:
+        output += "%X.%X\t%d instructions, %d of %d bytes (%.1f%%)\n" % (
+            start, end - 1, instructions, covered, end - start, 100.0 * covered / (end - start))
+    return output
@@ -2,78 +2,356 @@
 .. module:: Emulator
     :synopsis: Emulator class that runs the T34 Emulator
 """
+import hashlib
+import io
 import logging
 import math
+import os
+import pickle
 import string
-from intelhex import IntelHex
+import sys
+import time
+from collections import namedtuple
+from . import Cache
+from . import Condition
+from . import Coverage
+from . import History
+from . import Profiler
+from . import Recorder
+from . import Symbols
 from . import Instructions
+from . import Loader
 from . import Memory
 logger = logging.getLogger(__name__)
 
+# Reasons a run stops
+BRK = "BRK"
+MAX_STEPS = "max_steps"
+MAX_CYCLES = "max_cycles"
+UNTIL_PC = "until_pc"
+DEADLINE = "deadline"
+UNKNOWN_OPCODE = "unknown_opcode"
+BREAKPOINT = "breakpoint"
+WATCHPOINT = "watchpoint"
+REVERSE = "reverse"
+HISTORY_START = "history_start"
+ERROR = "error"
+
+# Reasons that make the flight recorder dump its records
+DUMP_REASONS = (BRK, UNKNOWN_OPCODE, MAX_STEPS, MAX_CYCLES, DEADLINE)
+
+# Breakpoint bitmap entries
+UNCONDITIONAL = 1
+CONDITIONAL = 2
+
+# Bits of a watchpoint bitmap entry
+WATCH_READ = 1
+WATCH_WRITE = 2
+WATCH_KINDS = {"R": WATCH_READ, "W": WATCH_WRITE, "RW": WATCH_READ | WATCH_WRITE}
+
+# Number of instructions between checks of the wall-clock deadline
+CHECK_INTERVAL = 1024
+
+CYCLE_TABLE = bytes(Instructions.CYCLES.get("%02X" % op, 0) for op in range(256))
+
+# Bytes in every instruction, the opcode included
+LENGTH_TABLE = bytes(Recorder.DECODE[op][2] + 1 if op in Recorder.DECODE else 1 for op in range(256))
+
+RunResult = namedtuple("RunResult", ["reason", "steps", "cycles", "pc"])
+
+Variant = namedtuple("Variant", ["start", "patches", "registers"], defaults=((), None))
+
+ExploreResult = namedtuple("ExploreResult", ["reason", "steps", "cycles", "pc", "registers",
+                                             "digest", "error"], defaults=(None,))
+
+SweepInput = namedtuple("SweepInput", ["patches", "registers"], defaults=((), None))
+
+SweepResult = namedtuple("SweepResult", ["results", "data", "width"])
+
 
 class Emulator(Instructions.Instructions):
     """Class to store an emulator and runs program files."""
 
-    def __init__(self, program_name=None):
+    def __init__(self, program_name=None, load_address=0, cache=None):
         """
         Creates an emulator and sets up the memory space for the main memory and the registers.
 
         :param program_name: name of the program file to be run
         :type program_name: string
+        :param load_address: address raw ``.bin`` programs are loaded at
+        :type load_address: int
+        :param cache: cache of decoded programs, defaults to the cache shared by the process
+        :type cache: Cache.ProgramCache
         """
         super().__init__()
         self.program = program_name
+        self.load_address = load_address
+        self.cache = cache
+        self.baseline = None
+        self.steps = 0
+        self.stop = None
+        self.history = None
+        self.recorder = None
+        self.coverage = None
+        self.profiler = None
+        self.symbols = None
+        self.clear_breakpoints()
         if self.program is not None:
             self.load_program()
 
+    def __getstate__(self):
+        """
+        Pickles the machine state and program details only. Snapshots, run results and the
+        program cache stay behind.
+        """
+        state = super().__getstate__()
+        state["program"] = self.program
+        state["load_address"] = self.load_address
+        return state
+
+    def __setstate__(self, state):
+        """
+        Restores the state saved by :meth:`__getstate__`.
+
+        :param dict state: pickled state.
+        """
+        super().__setstate__(state)
+        self.name = ""
+        self.cache = None
+        self.baseline = None
+        self.steps = 0
+        self.stop = None
+        self.history = None
+        self.recorder = None
+        self.coverage = None
+        self.profiler = None
+        self.symbols = None
+        self.clear_breakpoints()
+
+    def reset(self, clear_memory=True):
+        """
+        Puts the emulator back in its starting state without allocating new memory.
+
+        :param clear_memory: True to zero all of memory, False to keep it, or a list of
+            (start, end) ranges to zero, end exclusive.
+        """
+        super().reset(clear_memory)
+        self.baseline = None
+        self.steps = 0
+        self.stop = None
+        self.watch_hit = None
+        if self.history is not None:
+            self.history.clear()
+        if self.recorder is not None:
+            self.recorder.clear()
+        if self.profiler is not None:
+            self.profiler.unwind()
+
     def load_program(self):
         """
-        Loads the program.
+        Loads the program. Raw ``.bin`` images are loaded at ``load_address``, ``.prg`` images at
+        the address in their header and any other file is read as Intel HEX. Decoded programs
+        are cached by content, so loading the same file again only copies the image.
 
         :return: successful read
         :rtype: bool
         """
-        ih = IntelHex(self.program)
-        pydict = ih.todict()
-        for address in pydict:
-            self.memory[address:address +
-                        1] = pydict[address].to_bytes(1, byteorder="big")
+        cache = self.cache if self.cache is not None else Cache.shared
+        cache.load(self, self.program, self.load_address)
+
+    def save_program(self, path, ranges=None, dirty=False):
+        """
+        Saves memory as an Intel HEX file.
+
+        :param str path: name of the Intel HEX file.
+        :param list ranges: (start, end) for every range to save, end exclusive. Defaults to
+            every segment of memory holding non-zero bytes.
+        :param bool dirty: only look for segments in pages written since the last snapshot.
+        """
+        if ranges is None:
+            ranges = Loader.find_segments(self, self.dirty_pages() if dirty else None)
+        Loader.save_hex(self, path, ranges)
 
     def start_emulator(self):
         """Starts the emulator and evaluates and executes commands."""
         command = input("> ")
 
         while command != "exit":
-            pidx = command.find('.')
-            cidx = command.find(":")
-
-            # Run program
-            if command.endswith("R") or command.endswith("r"):
-                output = self.run_program(command[:-1])
-                print(output)
-
-            # Access memory range
-            elif pidx != -1:
-                output = self.access_memory_range(
-                    command[:pidx], command[pidx+1:])
-                print(output)
-
-            # Edit memory
-            elif cidx != -1:
-                self.edit_memory(command[:cidx], command[cidx+1:])
-
-            # Access memory address
-            elif pidx == -1:
-                try:
-                    output = self.access_memory(command)
-                    print(output)
-                except:
-                    pass
+            self.execute_command(command, sys.stdout)
+            command = input("> ")
 
+    def run_script(self, script, out):
+        """
+        Executes monitor commands without prompting until the script ends or reaches exit.
+
+        :param script: iterable of commands, such as an open file.
+        :param out: writer all of the results go through.
+        """
+        for command in script:
+            command = command.strip()
+            if command == "exit":
+                break
+            if command:
+                self.execute_command(command, out)
+
+    def execute_command(self, command, out):
+        """
+        Evaluates and executes a single monitor command.
+
+        :param str command: monitor command.
+        :param out: writer the results go to.
+        """
+        pidx = command.find('.')
+        cidx = command.find(":")
+        sidx = command.find("/")
+
+        keyword = command[:2].upper()
+
+        # Set a breakpoint or list breakpoints and watchpoints
+        if keyword == "BP":
+            fields = command[2:].split(None, 1)
+            if fields:
+                self.set_breakpoint(self.parse_address(fields[0]),
+                                    fields[1] if len(fields) > 1 else None)
             else:
-                exit()
+                out.write(self.list_breakpoints())
 
-            command = input("> ")
+        # Set a watchpoint or list breakpoints and watchpoints
+        elif keyword == "WP":
+            fields = command[2:].split()
+            if fields:
+                begin, _, end = fields[0].partition(".")
+                self.set_watchpoint(self.parse_address(begin), self.parse_address(end or begin) + 1,
+                                    fields[1].upper() if len(fields) > 1 else "W")
+            else:
+                out.write(self.list_breakpoints())
+
+        # Clear breakpoints and watchpoints
+        elif keyword == "CP":
+            if command[2:].strip():
+                begin, _, end = command[2:].strip().partition(".")
+                self.clear_breakpoints(self.parse_address(begin),
+                                       self.parse_address(end or begin) + 1)
+            else:
+                self.clear_breakpoints()
+
+        # Step back through the history
+        elif keyword == "SB":
+            count = int(command[2:] or "1")
+            if self.step_back(count) < count:
+                out.write("Start of history at %s\n" % self.describe(self.stop.pc))
+
+        # Run backwards to the previous breakpoint
+        elif keyword == "RC":
+            self.reverse_continue()
+            if self.stop.reason == BREAKPOINT:
+                out.write("Breakpoint at %s\n" % self.describe(self.stop.pc))
+            else:
+                out.write("Start of history at %s\n" % self.describe(self.stop.pc))
+
+        # Record the history of runs, or show how much is recorded
+        elif keyword == "HI":
+            if command[2:].strip():
+                self.record_history(int(command[2:]))
+            elif self.history is not None:
+                out.write("%d of %d\n" % (len(self.history), self.history.capacity))
+
+        # Keep the last trace records of runs, or dump them
+        elif keyword == "TR":
+            if command[2:].strip():
+                self.record_flight(int(command[2:]), out)
+            elif self.recorder is not None:
+                out.write(Recorder.HEADER)
+                out.writelines(self.recorder.lines(self, self.symbols))
+
+        # Record coverage, or report it
+        elif keyword == "CV":
+            argument = command[2:].strip().upper()
+            if argument in ("ON", "OFF"):
+                self.record_coverage(argument == "ON")
+            elif self.coverage is not None:
+                begin, _, end = argument.partition(".")
+                out.write(self.coverage_report(begin, end))
+
+        # Profile calls, report the profile or write it as folded stacks
+        elif keyword == "PF":
+            argument = command[2:].strip()
+            if argument.upper() in (Profiler.STEPS.upper(), Profiler.CYCLES.upper(), "OFF"):
+                self.record_profile(None if argument.upper() == "OFF" else argument.lower())
+            elif self.profiler is not None and argument:
+                with open(argument, "w") as folded:
+                    folded.writelines(self.profiler.folded(self.symbols and self.symbols.name))
+            elif self.profiler is not None:
+                out.write(self.profiler.report(self.symbols and self.symbols.name))
+
+        # Load a symbol table, or list it
+        elif keyword == "SY":
+            if command[2:].strip():
+                self.load_symbols(command[2:].strip())
+            elif self.symbols is not None:
+                out.write(self.symbols.listing())
+
+        # Run program, or continue from where the last run stopped
+        elif command.endswith("R") or command.endswith("r"):
+            address = command[:-1]
+            if not address and self.stop is not None:
+                address = "%X" % self.stop.pc
+            elif address:
+                address = "%X" % self.parse_address(address)
+            self.take_snapshot()
+            output = self.run_program(address)
+            out.write(output + "\n")
+            if self.stop.reason == BREAKPOINT:
+                out.write("Breakpoint at %s\n" % self.describe(self.stop.pc))
+            elif self.stop.reason == WATCHPOINT:
+                out.write("Watchpoint %s %s, stopped at %s\n" % (
+                    self.watch_hit[0], self.describe(self.watch_hit[1]), self.describe(self.stop.pc)))
+
+        # Snapshot memory
+        elif command in ("S", "s"):
+            self.take_snapshot()
+
+        # Show memory changed since the snapshot
+        elif command in ("V", "v"):
+            out.write(self.memory_diff())
+
+        # Move memory block
+        elif command[-1:] in ("M", "m") and command.find("<") != -1:
+            dest, _, source = command[:-1].partition("<")
+            begin, _, end = source.partition(".")
+            self.move_memory_range(dest, begin, end)
+
+        # Fill memory block
+        elif pidx != -1 and cidx > pidx:
+            self.fill_memory_range(
+                command[:pidx], command[pidx+1:cidx], command[cidx+1:])
+
+        # Search memory
+        elif sidx != -1:
+            begin, _, end = command[:sidx].partition(".")
+            out.write(self.search_memory_command(
+                command[sidx+1:], begin or None, end or None))
+
+        # Access memory range
+        elif pidx != -1:
+            self.dump_memory_range(
+                command[:pidx], command[pidx+1:], out)
+            out.write("\n")
+
+        # Edit memory
+        elif cidx != -1:
+            self.edit_memory(command[:cidx], command[cidx+1:])
+
+        # Access memory address
+        elif pidx == -1:
+            try:
+                output = self.access_memory(command)
+                out.write(output + "\n")
+            except:
+                pass
+
+        else:
+            exit()
 
     def access_memory(self, address):
         """
@@ -89,32 +367,107 @@ class Emulator(Instructions.Instructions):
         ad = int(address, 16)
         return address + "\t" + self.read_memory(ad, ad+1).hex().upper()
 
-    def access_memory_range(self, begin, end):
+    def access_memory_range(self, begin, end, width=8):
         """
         Accesses a memory range and displays all the contents.
 
         :param str begin: beginning HEX address of the memory to be accessed.
         :param str end: end HEX address of the memory to be accessed.
+        :param int width: number of bytes per line.
 
         :return out: contents of the memory range.
         :rtype: string
         """
+        return "".join(self.iter_memory_range(begin, end, width))
+
+    def iter_memory_range(self, begin, end, width=8):
+        """
+        Generates the lines of a memory range dump one at a time.
+
+        Memory is formatted a block at a time with a single ``hex`` call and cut into lines, so
+        dumps of any size run in constant memory.
+
+        :param str begin: beginning HEX address of the memory to be accessed.
+        :param str end: end HEX address of the memory to be accessed.
+        :param int width: number of bytes per line.
+
+        :return: lines of the dump, each ending in a newline.
+        :rtype: generator
+        """
         logger.debug("Accessing Memory Range: " + begin + " - " + end)
 
         b = int(begin, 16)
-        e = int(end, 16)
-        out = ""
+        e = int(end, 16) + 1
+        view = memoryview(self.memory)
+        block = width * 512
+        line = 3 * width
+
+        for s in range(b, e, block):
+            text = view[s:min(s + block, e)].hex(" ").upper()
+            for offset in range(0, len(text), line):
+                yield "%x\t%s\n" % (s + offset // 3, text[offset:offset + line - 1])
+
+    def dump_memory_range(self, begin, end, sink, width=8):
+        """
+        Writes a memory range dump to a file-like sink as it is generated.
+
+        :param str begin: beginning HEX address of the memory to be accessed.
+        :param str end: end HEX address of the memory to be accessed.
+        :param sink: object with a ``writelines`` method, such as an open file.
+        :param int width: number of bytes per line.
+        """
+        sink.writelines(self.iter_memory_range(begin, end, width))
+
+    def search_memory_command(self, pattern, begin=None, end=None):
+        """
+        Searches memory for a pattern of HEX bytes and lists every match.
+
+        A ``?`` in place of a HEX digit matches any value, so ``A9 ?? 8D`` finds every ``LDA #``
+        followed by an absolute store, and ``?0`` matches any multiple of 16. A single digit is
+        one byte, as in :meth:`edit_memory`, so ``5`` only matches ``05``; a lone ``?`` matches
+        any byte.
+
+        :param str pattern: HEX bytes separated by spaces.
+        :param str begin: beginning HEX address of the search, defaults to 0.
+        :param str end: end HEX address of the search, defaults to the end of memory.
+
+        :return out: addresses of the matches, one per line.
+        :rtype: string
+
+        :raises ValueError: if a byte of the pattern has more than two digits.
+        """
+        tokens = ["??" if token == "?" else token.zfill(2) for token in pattern.split()]
+        for token in tokens:
+            if len(token) > 2:
+                raise ValueError("not a byte: %s" % token)
+        value = bytes(int(token.replace("?", "0"), 16) for token in tokens)
+        mask = bytes(int("".join("0" if c == "?" else "F" for c in token), 16) for token in tokens)
+
+        b = 0 if begin is None else int(begin, 16)
+        e = len(self.memory) if end is None else int(end, 16) + 1
+        matches = self.search_memory(value, mask, b, e)
+        return "".join((hex(address).lstrip("0x") or "0") + "\n" for address in matches)
+
+    def take_snapshot(self):
+        """Saves the current memory image to compare later runs against."""
+        self.baseline = self.snapshot()
 
-        s = b
-        i = 0
-        while s <= e:
-            f = s+8 if s+8 <= e else e+1
-            data = self.read_memory(s, f)
-            # self.memory[s:f]
-            data = " ".join(["{:02x}".format(x).upper() for x in data])
-            out += (hex(s).lstrip("0x") or "0") + "\t" + str(data) + "\n"
-            i += 1
-            s = b + i*8
+    def memory_diff(self):
+        """
+        Lists the memory that has changed since the last snapshot.
+
+        :return out: one line per run of changed bytes, old contents then new contents.
+        :rtype: string
+        """
+        if self.baseline is None:
+            runs = self.diff_memory(bytes(len(self.memory)))
+        else:
+            runs = self.diff_memory(self.baseline, pages=self.dirty_pages())
+
+        out = ""
+        for address, old, new in runs:
+            out += (hex(address).lstrip("0x") or "0").upper() + "\t" + \
+                old.hex(" ").upper() + " -> " + new.hex(" ").upper() + "\n"
         return out
 
     def edit_memory(self, address, data):
@@ -128,43 +481,636 @@ class Emulator(Instructions.Instructions):
 
         self.write_memory(address, data)
 
-    def run_program(self, address):
+    def fill_memory_range(self, begin, end, data):
+        """
+        Fills a memory range with a pattern of bytes.
+
+        :param str begin: beginning HEX address of the range.
+        :param str end: end HEX address of the range.
+        :param str data: HEX bytes repeated across the range.
+        """
+        data = bytes(int(byte, base=16) for byte in data.split())
+        self.fill_memory(int(begin, 16), int(end, 16) + 1, data)
+
+    def move_memory_range(self, dest, begin, end):
+        """
+        Copies a memory range to another address. The ranges may overlap.
+
+        :param str dest: HEX address to copy to.
+        :param str begin: beginning HEX address of the range.
+        :param str end: end HEX address of the range.
+        """
+        self.move_memory(int(dest, 16), int(begin, 16), int(end, 16) + 1)
+
+    def set_breakpoint(self, address, condition=None):
+        """
+        Stops runs before the instruction at an address, optionally only when a condition holds.
+
+        The condition is compiled once by :func:`Condition.compile_condition`; the run loop only
+        calls it at addresses marked as conditional in the breakpoint bitmap.
+
+        :param int address: address of the instruction.
+        :param str condition: condition such as ``A == 0x10 and mem[0x07] > 3``.
+
+        :raises ValueError: if the condition is not valid.
+        """
+        if condition:
+            self.conditions[address] = (condition.strip(), Condition.compile_condition(condition))
+        else:
+            self.conditions.pop(address, None)
+        if self.breakpoints is None:
+            self.breakpoints = bytearray(65536)
+        if not self.breakpoints[address]:
+            self.break_count += 1
+        self.breakpoints[address] = CONDITIONAL if condition else UNCONDITIONAL
+
+    def set_watchpoint(self, start, end=None, kind="W"):
+        """
+        Stops runs after an instruction reads or writes a memory range.
+
+        :param int start: first address watched.
+        :param int end: address one past the last address watched, defaults to ``start + 1``.
+        :param str kind: ``R`` for reads, ``W`` for writes or ``RW`` for both.
+        """
+        bit = WATCH_KINDS[kind]
+        if self.watchpoints is None:
+            self.watchpoints = bytearray(65536)
+        for address in range(start, start + 1 if end is None else end):
+            self.watchpoints[address] |= bit
+        self._arm_watchpoints()
+
+    def clear_breakpoints(self, start=0, end=65536):
+        """
+        Removes the breakpoints and watchpoints in a range, by default all of them.
+
+        The breakpoint and watchpoint bitmaps are only allocated by the first
+        :meth:`set_breakpoint` or :meth:`set_watchpoint`, so clearing them all, as every new or
+        cloned emulator does, allocates and scans nothing.
+
+        :param int start: first address cleared.
+        :param int end: address one past the last address cleared.
+        """
+        if start == 0 and end >= 65536:
+            self.breakpoints = None
+            self.watchpoints = None
+            self.conditions = {}
+            self.break_count = 0
+            self.watch_count = 0
+            self.watch_hit = None
+            self.__dict__.pop("read_memory", None)
+            self.__dict__.pop("mark_dirty", None)
+            return
+        if self.breakpoints is not None:
+            self.breakpoints[start:end] = bytes(end - start)
+            self.break_count = len(self.breakpoints) - self.breakpoints.count(0)
+        for address in [address for address in self.conditions if start <= address < end]:
+            del self.conditions[address]
+        if self.watchpoints is not None:
+            self.watchpoints[start:end] = bytes(end - start)
+            self._arm_watchpoints()
+
+    def list_breakpoints(self):
+        """
+        Lists every breakpoint and watchpoint as the monitor command that sets it.
+
+        :return out: one ``BP`` or ``WP`` command per line, watchpoints joined into ranges.
+        :rtype: string
+        """
+        output = ""
+        if self.breakpoints is None:
+            breakpoints = []
+        else:
+            breakpoints = [address for address, kind in enumerate(self.breakpoints) if kind]
+        for address in breakpoints:
+            if address in self.conditions:
+                output += "BP %X %s\n" % (address, self.conditions[address][0])
+            else:
+                output += "BP %X\n" % address
+
+        names = {bit: kind for kind, bit in WATCH_KINDS.items()}
+        address = 0
+        while self.watchpoints is not None:
+            start = len(self.watchpoints) - len(self.watchpoints[address:].lstrip(b"\0"))
+            if start == len(self.watchpoints):
+                break
+            bit = self.watchpoints[start]
+            address = start + 1
+            while address < len(self.watchpoints) and self.watchpoints[address] == bit:
+                address += 1
+            if address - start == 1:
+                output += "WP %X %s\n" % (start, names[bit])
+            else:
+                output += "WP %X.%X %s\n" % (start, address - 1, names[bit])
+        return output
+
+    def _arm_watchpoints(self):
+        """
+        Routes memory reads and writes through the watchpoint checks only while watchpoints of
+        that kind are set, so unwatched runs pay nothing for them.
+        """
+        counts = [self.watchpoints.count(value) for value in range(4)]
+        reads = counts[WATCH_READ] + counts[WATCH_READ | WATCH_WRITE]
+        writes = counts[WATCH_WRITE] + counts[WATCH_READ | WATCH_WRITE]
+        self.watch_count = reads + writes
+        self.watch_hit = None
+        self.fetch = None
+        if reads:
+            self.read_memory = self.watched_read_memory
+        else:
+            self.__dict__.pop("read_memory", None)
+        if writes:
+            self.mark_dirty = self.watched_mark_dirty
+        else:
+            self.__dict__.pop("mark_dirty", None)
+
+    def watched_read_memory(self, start, end):
+        """
+        Reads memory, recording the first address read that has a read watchpoint. The bytes of
+        the instruction being executed are not watched, so fetching it is not a read.
+
+        :param int start: first address read.
+        :param int end: address one past the last address read.
+
+        :return: the bytes read.
+        :rtype: bytearray
+        """
+        if self.fetch is None:
+            fetch = fetch_end = -1
+        else:
+            fetch = self.fetch
+            fetch_end = fetch + LENGTH_TABLE[self.memory[fetch]]
+        for address in range(start, min(end, len(self.watchpoints))):
+            if self.watchpoints[address] & WATCH_READ and not fetch <= address < fetch_end:
+                self.watch_hit = ("R", address)
+                break
+        return super().read_memory(start, end)
+
+    def watched_mark_dirty(self, start, end):
+        """
+        Marks written pages dirty, recording the first address written that has a write
+        watchpoint. Every write to memory goes through :meth:`mark_dirty`.
+
+        :param int start: first address written.
+        :param int end: address one past the last byte written.
+        """
+        for address in range(start, min(end, len(self.watchpoints))):
+            if self.watchpoints[address] & WATCH_WRITE:
+                self.watch_hit = ("W", address)
+                break
+        super().mark_dirty(start, end)
+
+    def record_history(self, capacity):
+        """
+        Records the changes made by every instruction of later runs so they can be undone.
+
+        :param int capacity: number of instructions kept, 0 to stop recording.
+        """
+        self.history = History.History(capacity) if capacity else None
+
+    def record_flight(self, capacity, out=None):
+        """
+        Keeps the last trace records of later runs and dumps them when a run ends in a BRK, an
+        unknown opcode, a step, cycle or time limit, or an exception.
+
+        :param int capacity: number of instructions kept, 0 to stop recording.
+        :param out: writer the records are dumped to, defaults to standard error.
+        """
+        self.recorder = Recorder.FlightRecorder(capacity, out or sys.stderr) if capacity else None
+
+    def record_coverage(self, enable=True):
+        """
+        Marks the address of every instruction later runs execute in ``coverage``, a
+        :mod:`Coverage` bitmap.
+
+        :param bool enable: start recording into an empty bitmap, or stop recording.
+        """
+        self.coverage = bytearray(Coverage.SIZE) if enable else None
+
+    def record_profile(self, unit=Profiler.CYCLES):
+        """
+        Follows JSR and RTS through later runs and charges every instruction to its call path
+        in ``profiler``, a :class:`Profiler.Profiler`.
+
+        :param str unit: ``steps`` or ``cycles`` to start an empty profile, None to stop.
+        """
+        self.profiler = Profiler.Profiler(unit) if unit else None
+
+    def load_symbols(self, path):
+        """
+        Loads the labels of a label file or assembler listing into ``symbols``, a
+        :class:`Symbols.SymbolTable`. Traces, profiles and monitor messages then name addresses
+        by their nearest label, and monitor commands accept labels for addresses.
+
+        :param str path: name of the file.
+        """
+        self.symbols = Symbols.load(path)
+
+    def parse_address(self, text):
+        """
+        Reads an address typed at the monitor, as a label when a symbol table is loaded or in HEX.
+
+        :param str text: label or HEX address.
+
+        :return: the address.
+        :rtype: int
+        """
+        if self.symbols is not None:
+            return self.symbols.address(text)
+        return int(text, 16)
+
+    def describe(self, address):
+        """
+        Formats an address for a monitor message, followed by its label when a symbol table is
+        loaded.
+
+        :param int address: address to format.
+
+        :return out: such as ``304`` or ``304 (loop+2)``.
+        :rtype: string
+        """
+        if self.symbols is not None:
+            return "%X (%s)" % (address, self.symbols.name(address))
+        return "%X" % address
+
+    def coverage_report(self, begin=None, end=None):
+        """
+        Reports the coverage of a range, or of every segment of memory holding non-zero bytes.
+
+        :param str begin: beginning HEX address of the range.
+        :param str end: end HEX address of the range.
+
+        :return out: one line per range, see :func:`Coverage.format_report`.
+        :rtype: string
+        """
+        if begin:
+            ranges = [(int(begin, 16), int(end or begin, 16) + 1)]
+        else:
+            ranges = Loader.find_segments(self)
+        return Coverage.format_report(Coverage.report(self.coverage, ranges, self.memory))
+
+    def step_back(self, count=1):
+        """
+        Undoes the last instructions recorded in the history.
+
+        :param int count: number of instructions to undo.
+
+        :return: number of instructions undone, fewer than count at the start of the history.
+        :rtype: int
+        """
+        undone = 0
+        pc = None
+        while undone < count and self.history is not None:
+            address = self.history.undo(self)
+            if address is None:
+                break
+            pc = address
+            undone += 1
+        self._stop_reversing(HISTORY_START if undone < count else REVERSE, undone, pc)
+        return undone
+
+    def reverse_continue(self):
+        """
+        Undoes instructions until the next one to run is at a breakpoint whose condition holds,
+        or the start of the history is reached.
+
+        :return: number of instructions undone.
+        :rtype: int
+        """
+        undone = 0
+        pc = None
+        reason = HISTORY_START
+        breakpoints = self.breakpoints if self.break_count else bytes(65536)
+        while self.history is not None:
+            address = self.history.undo(self)
+            if address is None:
+                break
+            pc = address
+            undone += 1
+            kind = breakpoints[address]
+            if kind and (kind == UNCONDITIONAL or
+                         self.conditions[address][1](address, self.registers, self.memory)):
+                reason = BREAKPOINT
+                break
+        self._stop_reversing(reason, undone, pc)
+        return undone
+
+    def _stop_reversing(self, reason, undone, pc):
+        """Points ``stop`` at the instruction to run next after running backwards."""
+        if pc is None:
+            pc = self.stop.pc if self.stop is not None else self.get_PC() + 1
+        self.steps = max(self.steps - undone, 0)
+        self.stop = RunResult(reason, undone, 0, pc)
+
+    def run_program(self, address, max_steps=None, trace=True, out=None, **limits):
         """
         Start program at specific location in memory until end of program.
 
+        The reason the run stopped is kept in ``stop``.
+
         :param address: Location of the command to be executed.
-        :return output: Contents of all the registers.
+        :param int max_steps: stop after this many instructions even without a BRK.
+        :param bool trace: record a line of registers for every instruction.
+        :param out: writer the trace is streamed to instead of being returned.
+        :param limits: ``max_cycles``, ``until_pc`` or ``timeout``, see :meth:`run`.
+        :return output: Contents of all the registers, empty when streamed to out.
         :rtype: string
         """
-        output = " PC  OPC  INS   AMOD OPRND  AC XR YR SP NV-BDIZC\n"
-        pc = int(address, 16)
-        while True:
-            out, flag = self.execute_instruction(pc)
-            output += out
-            pc = self.get_PC() + 1
-            if flag == "BRK":
-                break
+        collect = out is None
+        if collect:
+            out = io.StringIO()
+        if trace:
+            out.write(" PC  OPC  INS   AMOD OPRND  AC XR YR SP NV-BDIZC\n")
 
-        return output
+        self.run(int(address, 16), max_steps, trace=trace, out=out, **limits)
+
+        return out.getvalue() if collect else ""
+
+    def run(self, pc, max_steps=None, max_cycles=None, until_pc=None, timeout=None,
+            trace=False, out=None):
+        """
+        Runs instructions from an address until a BRK, an opcode the T34 does not implement,
+        a breakpoint, a watchpoint or one of the limits is reached.
+
+        The step and deadline limits share one counter compared once per instruction; the clock
+        is only read every ``CHECK_INTERVAL`` instructions. A breakpoint stops the run before the
+        instruction at its address, if its condition holds, except for the first instruction,
+        so a run can continue from a breakpoint. A watchpoint stops the run after the
+        instruction that touched it.
+
+        :param int pc: address of the first instruction.
+        :param int max_steps: stop after this many instructions, so 0 runs none.
+        :param int max_cycles: stop once this many cycles have run, so 0 runs no instructions.
+        :param int until_pc: stop when the next instruction is at this address.
+        :param float timeout: stop after this many seconds of wall-clock time.
+        :param bool trace: write a line of registers for every instruction to out.
+        :param out: writer for the trace.
+
+        :return: why the run stopped, the steps and cycles run and the next address, which is
+            the unknown opcode's address when that stopped the run.
+        :rtype: RunResult
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        step_limit = math.inf if max_steps is None else max_steps
+        cycle_limit = math.inf if max_cycles is None else max_cycles
+        check = min(step_limit, CHECK_INTERVAL) if deadline is not None else step_limit
+
+        memory = self.memory
+        registers = self.registers
+        breakpoints = self.breakpoints if self.break_count else None
+        conditions = self.conditions
+        history = self.history
+        recorder = self.recorder
+        coverage = self.coverage
+        profiler = self.profiler
+        symbols = self.symbols
+        watching = self.watch_count > 0
+        self.watch_hit = None
+        steps = 0
+        cycles = 0
+        reason = None
+        if step_limit <= 0:
+            reason = MAX_STEPS
+        elif cycle_limit <= 0:
+            reason = MAX_CYCLES
+        try:
+            while reason is None:
+                cost = CYCLE_TABLE[memory[pc]]
+                if not cost:
+                    reason = UNKNOWN_OPCODE
+                    break
+                cycles += cost
+                if history is not None:
+                    history.record(self, pc)
+                if recorder is not None:
+                    recorder.record(self, pc)
+                if coverage is not None:
+                    coverage[pc] = 1
+                if profiler is not None:
+                    profiler.record(self, pc, cost)
+                line, flag = self.execute_instruction(pc, trace)
+                if trace:
+                    if symbols is not None:
+                        line = "%s  %s\n" % (line[:-1], symbols.name(pc))
+                    out.write(line)
+                steps += 1
+                pc = self.get_PC() + 1
+                if flag == "BRK":
+                    reason = BRK
+                    break
+                if watching and self.watch_hit is not None:
+                    reason = WATCHPOINT
+                    break
+                if breakpoints is not None and breakpoints[pc]:
+                    if breakpoints[pc] == UNCONDITIONAL or conditions[pc][1](pc, registers, memory):
+                        reason = BREAKPOINT
+                        break
+                if pc == until_pc:
+                    reason = UNTIL_PC
+                    break
+                if cycles >= cycle_limit:
+                    reason = MAX_CYCLES
+                    break
+                if steps >= check:
+                    if steps >= step_limit:
+                        reason = MAX_STEPS
+                        break
+                    if time.monotonic() >= deadline:
+                        reason = DEADLINE
+                        break
+                    check = min(step_limit, steps + CHECK_INTERVAL)
+        except Exception as error:
+            self.fetch = None
+            self.steps = steps
+            self.stop = RunResult(ERROR, steps, cycles, pc)
+            if recorder is not None:
+                recorder.dump(self, "%s: %s" % (type(error).__name__, error), pc, symbols)
+            raise
+
+        if recorder is not None and reason in DUMP_REASONS:
+            recorder.dump(self, reason, pc, symbols)
+
+        self.fetch = None
+        self.steps = steps
+        self.stop = RunResult(reason, steps, cycles, pc)
+        return self.stop
+
+    def fork_explore(self, variants, workers=None, digest=False, **limits):
+        """
+        Runs variants of the current machine in forked child processes.
+
+        Every child shares this emulator's memory copy-on-write, applies its variant's memory
+        patches and registers, runs without a trace and pipes back a compact result, so nothing
+        is reloaded or pickled on the way in. Needs ``os.fork``, so it is POSIX only.
+
+        :param variants: iterable of :class:`Variant` (start address, (address, bytes) patches,
+            register values).
+        :param int workers: number of children running at once, defaults to the number of CPUs.
+        :param bool digest: include a digest of each child's final memory.
+        :param limits: ``max_steps``, ``max_cycles``, ``until_pc`` or ``timeout`` for every run.
+
+        :return: one result per variant, in the order of the variants.
+        :rtype: list
+        """
+        variants = list(variants)
+        workers = workers or os.cpu_count() or 1
+        results = [None] * len(variants)
+        running = []
+        index = 0
+
+        try:
+            while index < len(variants) or running:
+                while index < len(variants) and len(running) < workers:
+                    read_fd, write_fd = os.pipe()
+                    pid = os.fork()
+                    if pid == 0:
+                        os.close(read_fd)
+                        self.explore_child(variants[index], digest, limits, write_fd)
+                    os.close(write_fd)
+                    running.append((pid, index, read_fd))
+                    index += 1
+
+                pid, done, read_fd = running.pop(0)
+                with os.fdopen(read_fd, "rb") as pipe:
+                    data = pipe.read()
+                os.waitpid(pid, 0)
+                if not data:
+                    raise RuntimeError("variant %d exited without a result" % done)
+                ok, value = pickle.loads(data)
+                if not ok:
+                    raise value
+                results[done] = value
+        finally:
+            for pid, _, read_fd in running:
+                os.close(read_fd)
+                os.waitpid(pid, 0)
+
+        return results
+
+    def explore_child(self, variant, digest, limits, write_fd):
+        """
+        Runs a variant in a forked child, writes the pickled outcome to a pipe and exits.
+
+        :param Variant variant: start address, memory patches and register values.
+        :param bool digest: include a digest of the final memory.
+        :param dict limits: limits for the run.
+        :param int write_fd: write end of the pipe to the parent.
+        """
+        code = 0
+        try:
+            try:
+                outcome = (True, self.explore_variant(variant, digest, limits))
+            except Exception as error:
+                outcome = (False, error)
+            with os.fdopen(write_fd, "wb") as pipe:
+                pickle.dump(outcome, pipe)
+        except BaseException:
+            code = 1
+        finally:
+            os._exit(code)
+
+    def explore_variant(self, variant, digest=False, limits=None):
+        """
+        Applies a variant to this machine and runs it. Used by :meth:`fork_explore` in the child.
+        A variant that raises ends with reason ``error`` and the exception in ``error``, so one
+        bad variant does not lose the results of the others; its pc is None if its start is not
+        a HEX address.
+
+        :param Variant variant: start address, memory patches and register values.
+        :param bool digest: include a digest of the final memory.
+        :param dict limits: limits for the run.
+
+        :return: the compact result of the run.
+        :rtype: ExploreResult
+        """
+        start = None
+        error = None
+        self.stop = None
+        try:
+            start = variant.start if isinstance(variant.start, int) else int(variant.start, 16)
+            for address, data in variant.patches:
+                self.write_memory(address, data)
+            if variant.registers:
+                self.set_registers(variant.registers)
+            result = self.run(start, **(limits or {}))
+        except Exception as exception:
+            error = "%s: %s" % (type(exception).__name__, exception)
+            result = self.stop or RunResult(ERROR, 0, 0, start)
+        return ExploreResult(*result, bytes(self.registers[:7]),
+                             hashlib.blake2b(self.memory, digest_size=16).hexdigest() if digest else None,
+                             error)
+
+    def sweep(self, start, inputs, outputs, **limits):
+        """
+        Runs the current machine once per input and gathers the same output bytes from each run.
+
+        The image is copied once up front. Every run applies its input's memory patches and
+        registers, runs without a trace, and then copies back only the pages the run dirtied,
+        so nothing is reloaded or reset between runs. Memory, registers and the dirty-page
+        bitmap are left as they were before the sweep.
+
+        :param start: address of the first instruction, as an int or a HEX string.
+        :param inputs: iterable of :class:`SweepInput` ((address, bytes) patches, register values).
+        :param outputs: addresses, or (start, end) ranges with end exclusive, to gather after
+            every run.
+        :param limits: ``max_steps``, ``max_cycles``, ``until_pc`` or ``timeout`` for every run.
+
+        :return: the result of every run and the gathered bytes, ``width`` bytes per run in the
+            order of the inputs.
+        :rtype: SweepResult
+        """
+        start = start if isinstance(start, int) else int(start, 16)
+        ranges = [(output, output + 1) if isinstance(output, int) else tuple(output)
+                  for output in outputs]
+        width = sum(end - begin for begin, end in ranges)
+        memory = self.memory
+        image = bytes(memory)
+        registers = bytes(self.registers)
+        dirty = bytes(self.dirty)
+        results = []
+        data = bytearray()
+
+        try:
+            for patches, values in inputs:
+                self.clear_dirty()
+                try:
+                    for address, patch in patches:
+                        self.write_memory(address, patch)
+                    if values:
+                        self.set_registers(values)
+                    results.append(self.run(start, **limits))
+                    for begin, end in ranges:
+                        data += memory[begin:end]
+                finally:
+                    for page in self.dirty_pages():
+                        memory[page << 8:(page + 1) << 8] = image[page << 8:(page + 1) << 8]
+                    self.registers[:] = registers
+        finally:
+            self.dirty[:] = dirty
+
+        return SweepResult(results, data, width)
 
-    def execute_instruction(self, address):
+    def execute_instruction(self, address, trace=True):
         """
         Gets the instruction stored in memory, decodes it and executes it.
 
         :param address: Location of the command to be executed
+        :param bool trace: format the trace line, otherwise an empty line is returned
         :return output: Contents of specific
         """
         logger.debug("Current PC: " + str(address))
 
         addr = address.to_bytes(2, byteorder='big')
         self.registers[:2] = addr[:]
+        self.fetch = address
 
-        op = self.read_memory(address, address+1).hex().upper()
+        op = "%02X" % self.memory[address]
         logger.debug("OPcode: " + op)
         ins = self.instructions[op]
 
-        data = ins()
+        data = ins(self)
         name = data[0]
+        if not trace:
+            return "", name
         amod = data[1]
         oprnd1 = "--"
         oprnd2 = "--"
@@ -0,0 +1,131 @@
+"""
+.. module:: History
+    :synopsis: Bounded record of instruction deltas used to run a T34 program backwards.
+"""
+import logging
+from array import array
+from . import Instructions
+logger = logging.getLogger(__name__)
+
+# Number of register bytes saved per instruction: PC, AC, X, Y, SP and SR
+REGISTER_BYTES = 7
+
+# Most bytes any instruction writes (BRK)
+MAX_WRITES = 3
+
+# Where an instruction writes, by opcode
+NO_WRITE, ZERO_PAGE, ABSOLUTE, PUSH, PUSH_RETURN, PUSH_BREAK = range(6)
+
+
+def _write_kinds():
+    """Builds the table of where every opcode writes from the instruction names."""
+    stores = ("sta", "stx", "sty", "inc", "dec", "asl", "lsr", "rol", "ror")
+    names = {"pha": PUSH, "php": PUSH, "jsr": PUSH_RETURN, "brk": PUSH_BREAK}
+    for store in stores:
+        names[store + "_zpg"] = ZERO_PAGE
+        names[store + "_abs"] = ABSOLUTE
+    kinds = bytearray(256)
+    for op, function in Instructions.Instructions.instructions.items():
+        kinds[int(op, 16)] = names.get(function.__name__, NO_WRITE)
+    return bytes(kinds)
+
+
+WRITE_KINDS = _write_kinds()
+
+
+class History:
+    """
+    Ring buffer of the registers and overwritten bytes from before every recorded instruction.
+
+    All of the storage is allocated up front: 7 register bytes, a write count and room for
+    three (address, old byte) pairs per instruction. Once full, the oldest instructions are
+    overwritten.
+    """
+
+    def __init__(self, capacity):
+        """
+        Creates an empty history.
+
+        :param int capacity: number of instructions kept.
+        """
+        self.capacity = capacity
+        self.pcs = array("H", bytes(2 * capacity))
+        self.registers = bytearray(REGISTER_BYTES * capacity)
+        self.counts = bytearray(capacity)
+        self.addresses = array("H", bytes(2 * MAX_WRITES * capacity))
+        self.values = bytearray(MAX_WRITES * capacity)
+        self.head = 0
+        self.size = 0
+
+    def __len__(self):
+        return self.size
+
+    def clear(self):
+        """Forgets every recorded instruction."""
+        self.head = 0
+        self.size = 0
+
+    def record(self, machine, pc):
+        """
+        Saves what the instruction at an address is about to change. Called before it runs.
+
+        :param Memory machine: machine about to run the instruction.
+        :param int pc: address of the instruction.
+        """
+        memory = machine.memory
+        slot = self.head
+        self.pcs[slot] = pc
+        offset = slot * REGISTER_BYTES
+        self.registers[offset:offset + REGISTER_BYTES] = machine.registers[:REGISTER_BYTES]
+
+        kind = WRITE_KINDS[memory[pc]]
+        base = slot * MAX_WRITES
+        if kind == NO_WRITE:
+            count = 0
+        elif kind == ZERO_PAGE:
+            self.addresses[base] = memory[pc + 1]
+            count = 1
+        elif kind == ABSOLUTE:
+            self.addresses[base] = memory[pc + 1] | (memory[pc + 2] << 8)
+            count = 1
+        else:
+            stack = machine.registers[5] + 256
+            self.addresses[base] = stack
+            count = 1
+            if kind != PUSH:
+                self.addresses[base + 1] = stack + 1
+                count = 2
+            if kind == PUSH_BREAK:
+                self.addresses[base + 2] = stack - 2
+                count = 3
+        for index in range(base, base + count):
+            self.values[index] = memory[self.addresses[index]]
+        self.counts[slot] = count
+
+        self.head = slot + 1 if slot + 1 < self.capacity else 0
+        if self.size < self.capacity:
+            self.size += 1
+
+    def undo(self, machine):
+        """
+        Puts back the registers and memory from before the last recorded instruction.
+
+        :param Memory machine: machine the instruction ran on.
+
+        :return: address of the instruction undone, or None when nothing is recorded.
+        :rtype: int
+        """
+        if not self.size:
+            return None
+        self.size -= 1
+        slot = self.head - 1 if self.head else self.capacity - 1
+        self.head = slot
+
+        base = slot * MAX_WRITES
+        for index in range(base + self.counts[slot] - 1, base - 1, -1):
+            address = self.addresses[index]
+            machine.memory[address] = self.values[index]
+            machine.mark_dirty(address, address + 1)
+        offset = slot * REGISTER_BYTES
+        machine.registers[:REGISTER_BYTES] = self.registers[offset:offset + REGISTER_BYTES]
+        return self.pcs[slot]
@@ -7,108 +7,111 @@ from . import Memory
 import logging
 logger = logging.getLogger(__name__)
 
+# Base cycle count of every implemented opcode. Extra cycles for taken branches and
+# page crossings are not counted.
+CYCLES = {
+    "00": 7,
+    "05": 3,
+    "06": 5,
+    "08": 3,
+    "09": 2,
+    "0A": 2,
+    "0E": 6,
+    "0D": 4,
+    "10": 2,
+    "18": 2,
+    "20": 6,
+    "24": 3,
+    "25": 3,
+    "26": 5,
+    "28": 4,
+    "29": 2,
+    "2A": 2,
+    "2C": 4,
+    "2D": 4,
+    "2E": 6,
+    "30": 2,
+    "38": 2,
+    "45": 3,
+    "46": 5,
+    "48": 3,
+    "49": 2,
+    "4A": 2,
+    "4C": 3,
+    "4D": 4,
+    "4E": 6,
+    "50": 2,
+    "58": 2,
+    "60": 6,
+    "65": 3,
+    "66": 5,
+    "68": 4,
+    "69": 2,
+    "6A": 2,
+    "6C": 5,
+    "6D": 4,
+    "6E": 6,
+    "70": 2,
+    "78": 2,
+    "84": 3,
+    "85": 3,
+    "86": 3,
+    "88": 2,
+    "8A": 2,
+    "8C": 4,
+    "8D": 4,
+    "8E": 4,
+    "90": 2,
+    "98": 2,
+    "9A": 2,
+    "B8": 2,
+    "A0": 2,
+    "A2": 2,
+    "A4": 3,
+    "A5": 3,
+    "A6": 3,
+    "A8": 2,
+    "A9": 2,
+    "AA": 2,
+    "AC": 4,
+    "AD": 4,
+    "AE": 4,
+    "B0": 2,
+    "BA": 2,
+    "C0": 2,
+    "C4": 3,
+    "C5": 3,
+    "C6": 5,
+    "C8": 2,
+    "C9": 2,
+    "CA": 2,
+    "CC": 4,
+    "CD": 4,
+    "CE": 6,
+    "D0": 2,
+    "D8": 2,
+    "E0": 2,
+    "E4": 3,
+    "E5": 3,
+    "E6": 5,
+    "E8": 2,
+    "E9": 2,
+    "EA": 2,
+    "EC": 4,
+    "ED": 4,
+    "EE": 6,
+    "F0": 2,
+    "F8": 2
+}
+
 
 class Instructions(Memory.Memory):
     """Class that handles all of the instructions to be executed by the T34."""
 
     def __init__(self):
-        """Creates the dictionary that is used to execute instructions."""
+        """Creates the memory and registers the instructions operate on."""
         super().__init__()
         self.name = ""
-        self.instructions = {
-            "00": self.brk,
-            "05": self.ora_zpg,
-            "06": self.asl_zpg,
-            "08": self.php,
-            "09": self.ora_imm,
-            "0A": self.asl,
-            "0E": self.asl_abs,
-            "0D": self.ora_abs,
-            "10": self.bpl_rel,
-            "18": self.clc,
-            "20": self.jsr,
-            "24": self.bit_zpg,
-            "25": self.and_zpg,
-            "26": self.rol_zpg,
-            "28": self.plp,
-            "29": self.and_imm,
-            "2A": self.rol,
-            "2C": self.bit_abs,
-            "2D": self.and_abs,
-            "2E": self.rol_abs,
-            "30": self.bmi_rel,
-            "38": self.sec,
-            "45": self.eor_zpg,
-            "46": self.lsr_zpg,
-            "48": self.pha,
-            "49": self.eor_imm,
-            "4A": self.lsr,
-            "4C": self.jmp_abs,
-            "4D": self.eor_abs,
-            "4E": self.lsr_abs,
-            "50": self.bvc,
-            "58": self.cli,
-            "60": self.rts,
-            "65": self.adc_zpg,
-            "66": self.ror_zpg,
-            "68": self.pla,
-            "69": self.adc_imm,
-            "6A": self.ror,
-            "6C": self.jmp_ind,
-            "6D": self.adc_abs,
-            "6E": self.ror_abs,
-            "70": self.bvs,
-            "78": self.sei,
-            "84": self.sty_zpg,
-            "85": self.sta_zpg,
-            "86": self.stx_zpg,
-            "88": self.dey,
-            "8A": self.txa,
-            "8C": self.sty_abs,
-            "8D": self.sta_abs,
-            "8E": self.stx_abs,
-            "90": self.bcc_rel,
-            "98": self.tya,
-            "9A": self.txs,
-            "B8": self.clv,
-            "A0": self.ldy_imm,
-            "A2": self.ldx_imm,
-            "A4": self.ldy_zpg,
-            "A5": self.lda_zpg,
-            "A6": self.ldx_zpg,
-            "A8": self.tay,
-            "A9": self.lda_imm,
-            "AA": self.tax,
-            "AC": self.ldy_abs,
-            "AD": self.lda_abs,
-            "AE": self.ldx_abs,
-            "B0": self.bcs_rel,
-            "BA": self.tsx,
-            "C0": self.cpy_imm,
-            "C4": self.cpy_zpg,
-            "C5": self.cmp_zpg,
-            "C6": self.dec_zpg,
-            "C8": self.iny,
-            "C9": self.cmp_imm,
-            "CA": self.dex,
-            "CC": self.cpy_abs,
-            "CD": self.cmp_abs,
-            "CE": self.dec_abs,
-            "D0": self.bne_rel,
-            "D8": self.cld,
-            "E0": self.cpx_imm,
-            "E4": self.cpx_zpg,
-            "E5": self.sbc_zpg,
-            "E6": self.inc_zpg,
-            "E8": self.inx,
-            "E9": self.sbc_imm,
-            "EA": self.nop,
-            "EC": self.cpx_abs,
-            "ED": self.sbc_abs,
-            "EE": self.inc_abs,
-            "F0": self.beq_rel,
-            "F8": self.sed
-        }
 
     def adc_abs(self):
         """
@@ -694,6 +697,7 @@ class Instructions(Memory.Memory):
 
         # Push program counter to stack
         self.memory[sp:sp+2] = pc.to_bytes(2, byteorder='big')
+        self.mark_dirty(sp, sp+2)
         sp -= 2
 
         sr = int(self.registers[6:7].hex(), 16)
@@ -704,6 +708,7 @@ class Instructions(Memory.Memory):
 
         # Push current processor status to stack
         self.memory[sp:sp+1] = sr.to_bytes(1, byteorder='big')
+        self.mark_dirty(sp, sp+1)
         sp -= 1
         sp -= 256
         self.registers[5:6] = sp.to_bytes(1, byteorder='big')
@@ -1997,6 +2002,7 @@ class Instructions(Memory.Memory):
         sp += 256
         # self.write_memory(sp, self.registers[2:3])
         self.memory[sp:sp+1] = self.registers[2:3]
+        self.mark_dirty(sp, sp+1)
         sp -= 1
         sp -= 256
         self.registers[5:6] = sp.to_bytes(1, byteorder='big')
@@ -2020,6 +2026,7 @@ class Instructions(Memory.Memory):
         sp = int(self.registers[5:6].hex(), 16)
         sp += 256
         self.memory[sp:sp+1] = self.registers[6:7]
+        self.mark_dirty(sp, sp+1)
         sp -= 1
         sp -= 256
         self.registers[5:6] = sp.to_bytes(1, byteorder='big')
@@ -2817,4 +2824,100 @@ class Instructions(Memory.Memory):
         sign = (y & (1 << 7)) >> 7
         self.check_negative_sign(sign)
         self.check_zero(y)
-        return "TYA", "impl"
\ No newline at end of file
+        return "TYA", "impl"
+
+    # Opcode to the function executing it, shared by every instance
+    instructions = {
+        "00": brk,
+        "05": ora_zpg,
+        "06": asl_zpg,
+        "08": php,
+        "09": ora_imm,
+        "0A": asl,
+        "0E": asl_abs,
+        "0D": ora_abs,
+        "10": bpl_rel,
+        "18": clc,
+        "20": jsr,
+        "24": bit_zpg,
+        "25": and_zpg,
+        "26": rol_zpg,
+        "28": plp,
+        "29": and_imm,
+        "2A": rol,
+        "2C": bit_abs,
+        "2D": and_abs,
+        "2E": rol_abs,
+        "30": bmi_rel,
+        "38": sec,
+        "45": eor_zpg,
+        "46": lsr_zpg,
+        "48": pha,
+        "49": eor_imm,
+        "4A": lsr,
+        "4C": jmp_abs,
+        "4D": eor_abs,
+        "4E": lsr_abs,
+        "50": bvc,
+        "58": cli,
+        "60": rts,
+        "65": adc_zpg,
+        "66": ror_zpg,
+        "68": pla,
+        "69": adc_imm,
+        "6A": ror,
+        "6C": jmp_ind,
+        "6D": adc_abs,
+        "6E": ror_abs,
+        "70": bvs,
+        "78": sei,
+        "84": sty_zpg,
+        "85": sta_zpg,
+        "86": stx_zpg,
+        "88": dey,
+        "8A": txa,
+        "8C": sty_abs,
+        "8D": sta_abs,
+        "8E": stx_abs,
+        "90": bcc_rel,
+        "98": tya,
+        "9A": txs,
+        "B8": clv,
+        "A0": ldy_imm,
+        "A2": ldx_imm,
+        "A4": ldy_zpg,
+        "A5": lda_zpg,
+        "A6": ldx_zpg,
+        "A8": tay,
+        "A9": lda_imm,
+        "AA": tax,
+        "AC": ldy_abs,
+        "AD": lda_abs,
+        "AE": ldx_abs,
+        "B0": bcs_rel,
+        "BA": tsx,
+        "C0": cpy_imm,
+        "C4": cpy_zpg,
+        "C5": cmp_zpg,
+        "C6": dec_zpg,
+        "C8": iny,
+        "C9": cmp_imm,
+        "CA": dex,
+        "CC": cpy_abs,
+        "CD": cmp_abs,
+        "CE": dec_abs,
+        "D0": bne_rel,
+        "D8": cld,
+        "E0": cpx_imm,
+        "E4": cpx_zpg,
+        "E5": sbc_zpg,
+        "E6": inc_zpg,
+        "E8": inx,
+        "E9": sbc_imm,
+        "EA": nop,
+        "EC": cpx_abs,
+        "ED": sbc_abs,
+        "EE": inc_abs,
+        "F0": beq_rel,
+        "F8": sed
+    }
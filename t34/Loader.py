@@ -0,0 +1,183 @@
+"""
+.. module:: Loader
+    :synopsis: Loaders that read program images straight into the T34 memory.
+"""
+import logging
+import os
+logger = logging.getLogger(__name__)
+
+DATA = 0x00
+END_OF_FILE = 0x01
+EXTENDED_SEGMENT_ADDRESS = 0x02
+START_SEGMENT_ADDRESS = 0x03
+EXTENDED_LINEAR_ADDRESS = 0x04
+START_LINEAR_ADDRESS = 0x05
+
+
+def load_hex(memory, path):
+    """
+    Streams an Intel HEX file into memory one record at a time.
+
+    Each data record is decoded with a single ``bytes.fromhex`` and written with a single
+    slice assignment.
+
+    :param Memory memory: memory the program is loaded into.
+    :param str path: name of the Intel HEX file.
+
+    :raises ValueError: on a malformed record, a bad checksum or data outside of memory.
+    """
+    size = len(memory.memory)
+    base = 0
+    with open(path, "r") as hex_file:
+        for number, line in enumerate(hex_file, 1):
+            line = line.strip()
+            if not line:
+                continue
+            if line[0] != ":":
+                raise ValueError("%s:%d: record does not start with ':'" % (path, number))
+            try:
+                record = bytes.fromhex(line[1:])
+            except ValueError:
+                raise ValueError("%s:%d: record is not HEX" % (path, number))
+            if len(record) < 5 or len(record) != record[0] + 5:
+                raise ValueError("%s:%d: record length is wrong" % (path, number))
+            if sum(record) & 0xFF:
+                raise ValueError("%s:%d: checksum is wrong" % (path, number))
+
+            kind = record[3]
+            if kind == DATA:
+                start = base + ((record[1] << 8) | record[2])
+                end = start + record[0]
+                if end > size:
+                    raise ValueError("%s:%d: data is outside of memory" % (path, number))
+                memory.memory[start:end] = record[4:-1]
+                memory.mark_dirty(start, end)
+            elif kind == END_OF_FILE:
+                break
+            elif kind in (EXTENDED_SEGMENT_ADDRESS, EXTENDED_LINEAR_ADDRESS):
+                if record[0] != 2:
+                    raise ValueError("%s:%d: record length is wrong" % (path, number))
+                base = (record[4] << 8) | record[5]
+                base <<= 4 if kind == EXTENDED_SEGMENT_ADDRESS else 16
+            elif kind in (START_SEGMENT_ADDRESS, START_LINEAR_ADDRESS):
+                logger.debug("Ignoring start address record")
+            else:
+                raise ValueError("%s:%d: unknown record type %02X" % (path, number, kind))
+
+
+def load_bin(memory, path, address=0):
+    """
+    Reads a raw binary image straight into memory starting at a load address.
+
+    :param Memory memory: memory the program is loaded into.
+    :param str path: name of the binary file.
+    :param int address: address of the first byte of the image.
+
+    :raises ValueError: if the image does not fit in memory.
+    """
+    with open(path, "rb") as bin_file:
+        _read_image(memory, bin_file, path, address)
+
+
+def load_prg(memory, path):
+    """
+    Reads a C64-style PRG image, whose first two bytes are the little-endian load address.
+
+    :param Memory memory: memory the program is loaded into.
+    :param str path: name of the PRG file.
+
+    :raises ValueError: if the header is missing or the image does not fit in memory.
+    """
+    with open(path, "rb") as prg_file:
+        header = prg_file.read(2)
+        if len(header) != 2:
+            raise ValueError("%s: missing load address" % path)
+        _read_image(memory, prg_file, path, int.from_bytes(header, byteorder="little"))
+
+
+def load(memory, path, address=0):
+    """
+    Loads a program image, picking the format from the file extension.
+
+    ``.bin`` files are raw images loaded at ``address``, ``.prg`` files carry their own
+    load address, and anything else is read as Intel HEX.
+
+    :param Memory memory: memory the program is loaded into.
+    :param str path: name of the program file.
+    :param int address: load address for raw binary images.
+    """
+    extension = os.path.splitext(path)[1].lower()
+    if extension == ".bin":
+        load_bin(memory, path, address)
+    elif extension == ".prg":
+        load_prg(memory, path)
+    else:
+        load_hex(memory, path)
+
+
+def find_segments(memory, pages=None):
+    """
+    Finds the segments of memory holding non-zero bytes.
+
+    Whole pages are compared against a zero page, runs of non-zero pages are joined, and only
+    the zeros at either end of a run are trimmed.
+
+    :param Memory memory: memory to scan.
+    :param pages: pages to scan, defaults to all of them.
+    :type pages: list
+
+    :return: (start, end) for every segment, end exclusive.
+    :rtype: list
+    """
+    view = memoryview(memory.memory)
+    zero = bytes(256)
+    if pages is None:
+        pages = range(len(memory.memory) >> 8)
+
+    runs = []
+    for page in pages:
+        start = page << 8
+        if view[start:start+256] == zero:
+            continue
+        if runs and runs[-1][1] == start:
+            runs[-1][1] = start + 256
+        else:
+            runs.append([start, start + 256])
+
+    segments = []
+    for start, end in runs:
+        data = bytes(view[start:end])
+        segments.append((start + len(data) - len(data.lstrip(b"\0")),
+                         end - len(data) + len(data.rstrip(b"\0"))))
+    return segments
+
+
+def save_hex(memory, path, ranges, record_size=32):
+    """
+    Writes memory ranges out as an Intel HEX file in a single write.
+
+    :param Memory memory: memory to save.
+    :param str path: name of the Intel HEX file.
+    :param list ranges: (start, end) for every range to save, end exclusive.
+    :param int record_size: number of data bytes per record.
+    """
+    view = memoryview(memory.memory)
+    records = []
+    for start, end in ranges:
+        for address in range(start, end, record_size):
+            data = view[address:min(address + record_size, end)]
+            record = bytes((len(data), address >> 8, address & 0xFF, DATA)) + data
+            records.append(":%s%02X" % (record.hex().upper(), -sum(record) & 0xFF))
+    records.append(":00000001FF\n")
+    with open(path, "w") as hex_file:
+        hex_file.write("\n".join(records))
+
+
+def _read_image(memory, image, path, address):
+    """Reads the rest of an open image file into memory with a single readinto."""
+    size = os.fstat(image.fileno()).st_size - image.tell()
+    end = address + size
+    if address < 0 or end > len(memory.memory):
+        raise ValueError("%s: image does not fit in memory at %04X" % (path, address))
+    count = image.readinto(memoryview(memory.memory)[address:end])
+    memory.mark_dirty(address, address + count)
@@ -0,0 +1,526 @@
+"""
+.. module:: Lockstep
+    :synopsis: Runs many copies of a T34 machine in lockstep with NumPy.
+
+Every machine is a row of a ``count`` x 65536 memory array plus an entry in each register
+array. Machines at the same PC running the same opcode execute that instruction together
+with masked array operations, and split into separate groups as soon as their PCs or opcodes
+differ. Results match :class:`Emulator` instruction for instruction, including its
+quirks. Where the Emulator would raise an exception, the machine stops with reason ``error``
+and its state is left unspecified.
+
+NumPy is only needed by this module.
+"""
+import logging
+import numpy as np
+from . import Emulator
+from . import Instructions
+logger = logging.getLogger(__name__)
+
+ERROR = Emulator.ERROR
+
+# Stop reasons by code, code 0 means still running
+REASONS = (None, Emulator.BRK, Emulator.MAX_STEPS, Emulator.UNKNOWN_OPCODE, ERROR)
+RUNNING, STOP_BRK, STOP_MAX_STEPS, STOP_UNKNOWN_OPCODE, STOP_ERROR = range(5)
+
+C, Z, I, D, B, V, N = 1, 2, 4, 8, 16, 64, 128
+
+CYCLE_TABLE = np.frombuffer(Emulator.CYCLE_TABLE, dtype=np.uint8).astype(np.int64)
+
+# Value of each byte read as a single HEX digit, as SBC abs does, or -1
+HEX_DIGIT = np.full(256, -1, dtype=np.int32)
+for _digit in "0123456789abcdefABCDEF":
+    HEX_DIGIT[ord(_digit)] = int(_digit, 16)
+
+
+class Lockstep:
+    """Runs ``count`` copies of a machine over NumPy arrays."""
+
+    def __init__(self, template, count):
+        """
+        Copies a machine's memory and registers into every one of ``count`` instances.
+
+        :param Memory template: machine to copy, usually an Emulator with a program loaded.
+        :param int count: number of instances.
+        """
+        self.count = count
+        self.memory = np.tile(np.frombuffer(bytes(template.memory), dtype=np.uint8), (count, 1))
+        registers = template.get_registers()
+        self.pc = np.full(count, registers["PC"], dtype=np.int64)
+        self.ac = np.full(count, registers["AC"], dtype=np.int64)
+        self.x = np.full(count, registers["X"], dtype=np.int64)
+        self.y = np.full(count, registers["Y"], dtype=np.int64)
+        self.sp = np.full(count, registers["SP"], dtype=np.int64)
+        self.sr = np.full(count, registers["SR"], dtype=np.int64)
+        self.steps = np.zeros(count, dtype=np.int64)
+        self.cycles = np.zeros(count, dtype=np.int64)
+        self.reason = np.zeros(count, dtype=np.uint8)
+        self.next_pc = np.zeros(count, dtype=np.int64)
+
+    def set_register(self, name, values):
+        """
+        Sets a register of every instance.
+
+        :param str name: PC, AC, X, Y, SP or SR.
+        :param values: one value for all instances or one per instance.
+        """
+        getattr(self, name.lower())[:] = values
+
+    def get_registers(self, index):
+        """
+        Retrieves the registers of one instance.
+
+        :param int index: instance number.
+
+        :return: register name to value, as :meth:`Memory.get_registers`.
+        :rtype: dict
+        """
+        return {"PC": int(self.pc[index]), "AC": int(self.ac[index]), "X": int(self.x[index]),
+                "Y": int(self.y[index]), "SP": int(self.sp[index]), "SR": int(self.sr[index])}
+
+    def set_registers(self, index, registers):
+        """
+        Sets the registers of one instance.
+
+        :param int index: instance number.
+        :param dict registers: register name to value, as :meth:`Memory.set_registers`.
+        """
+        for name, value in registers.items():
+            getattr(self, name.lower())[index] = value
+
+    def get_reason(self, index):
+        """
+        Retrieves why an instance stopped.
+
+        :param int index: instance number.
+
+        :return: the stop reason, None while the instance can still run.
+        :rtype: string
+        """
+        return REASONS[self.reason[index]]
+
+    def run(self, start, max_steps=None):
+        """
+        Runs every instance from an address until each one stops.
+
+        :param int start: address of the first instruction.
+        :param int max_steps: stop every instance after this many instructions.
+
+        :return: number of instances that stopped for each reason.
+        :rtype: dict
+        """
+        self.next_pc[:] = start
+        self.reason[:] = RUNNING
+        self.steps[:] = 0
+        self.cycles[:] = 0
+
+        step = 0
+        while max_steps is None or step < max_steps:
+            running = np.flatnonzero(self.reason == RUNNING)
+            if not len(running):
+                break
+            self.step(running)
+            step += 1
+        self.reason[self.reason == RUNNING] = STOP_MAX_STEPS
+
+        codes, counts = np.unique(self.reason, return_counts=True)
+        return {REASONS[code]: int(total) for code, total in zip(codes, counts)}
+
+    def step(self, running):
+        """
+        Executes one instruction on every given instance, grouping them by PC and opcode.
+
+        :param running: indices of the instances to step.
+        """
+        pcs = self.next_pc[running]
+        bad = pcs > 0xFFFF
+        if bad.any():
+            self.reason[running[bad]] = STOP_ERROR
+            running = running[~bad]
+            pcs = pcs[~bad]
+
+        opcodes = self.memory[running, pcs].astype(np.int64)
+        if len(running) and (pcs == pcs[0]).all() and (opcodes == opcodes[0]).all():
+            groups = [(running, int(pcs[0]), int(opcodes[0]))]
+        else:
+            keys, inverse = np.unique(pcs * 256 + opcodes, return_inverse=True)
+            groups = [(running[inverse == number], int(key) >> 8, int(key) & 0xFF)
+                      for number, key in enumerate(keys)]
+
+        for idx, pc, opcode in groups:
+            handler = DISPATCH.get(opcode)
+            if handler is None:
+                self.reason[idx] = STOP_UNKNOWN_OPCODE
+                continue
+            self.pc[idx] = pc
+            self.cycles[idx] += CYCLE_TABLE[opcode]
+            self.steps[idx] += 1
+            bad = handler(self, idx, pc)
+            if bad is not None and bad.any():
+                self.reason[idx[bad]] = STOP_ERROR
+            bad = (self.pc[idx] < 0) | (self.pc[idx] > 0xFFFF)
+            if bad.any():
+                self.reason[idx[bad]] = STOP_ERROR
+            self.next_pc[idx] = self.pc[idx] + 1
+
+    # Helpers
+
+    def read(self, idx, address):
+        """Reads a byte per instance."""
+        return self.memory[idx, address & 0xFFFF].astype(np.int64)
+
+    def write(self, idx, address, values):
+        """Writes a byte per instance."""
+        self.memory[idx, address & 0xFFFF] = values
+
+    def flag(self, idx, bit, condition):
+        """Sets a status bit where condition holds and clears it elsewhere."""
+        self.sr[idx] = np.where(condition, self.sr[idx] | bit, self.sr[idx] & ~bit)
+
+    def zero_negative(self, idx, value):
+        """Sets Z and N from a result, as check_zero and check_negative do for 0..255."""
+        self.flag(idx, Z, value == 0)
+        self.flag(idx, N, value & 0x80)
+
+    def operand(self, idx, pc, mode):
+        """
+        Fetches the operand of an instruction and advances the PC register past it.
+
+        :return: the operand value and, except for immediates, its address.
+        """
+        if mode == "imm":
+            self.pc[idx] = pc + 1
+            return self.read(idx, np.full(len(idx), pc + 1)), None
+        if mode == "zpg":
+            self.pc[idx] = pc + 1
+            address = self.read(idx, np.full(len(idx), pc + 1))
+        else:
+            self.pc[idx] = pc + 2
+            address = self.read(idx, np.full(len(idx), pc + 1)) | \
+                (self.read(idx, np.full(len(idx), pc + 2)) << 8)
+        return self.read(idx, address), address
+
+
+# Instruction groups. Each takes the machines, the indices of the instances and their common
+# PC, and returns a mask of the instances where the Emulator would raise, or None.
+
+def load(register, mode):
+    def execute(self, idx, pc):
+        value, _ = self.operand(idx, pc, mode)
+        getattr(self, register)[idx] = value
+        self.zero_negative(idx, value)
+    return execute
+
+
+def store(register, mode):
+    def execute(self, idx, pc):
+        _, address = self.operand(idx, pc, mode)
+        self.write(idx, address, getattr(self, register)[idx])
+    return execute
+
+
+def logic(operation, mode):
+    def execute(self, idx, pc):
+        value, _ = self.operand(idx, pc, mode)
+        result = operation(self.ac[idx], value)
+        self.ac[idx] = result
+        self.zero_negative(idx, result)
+    return execute
+
+
+def adc(mode):
+    def execute(self, idx, pc):
+        value, _ = self.operand(idx, pc, mode)
+        ac = self.ac[idx]
+        total = ac + value + (self.sr[idx] & C)
+        result = np.where(total == 256, 0, np.where(total > 256, total - 256, total))
+        self.flag(idx, V, ((ac >> 7) & (value >> 7)) != (result >> 7))
+        self.flag(idx, C, total > 256)
+        self.ac[idx] = result
+        self.zero_negative(idx, result)
+    return execute
+
+
+def sbc(mode):
+    def execute(self, idx, pc):
+        value, _ = self.operand(idx, pc, mode)
+        if mode == "zpg":
+            # Emulator.sbc_zpg indexes memory with a string and always raises
+            return np.ones(len(idx), dtype=bool)
+        bad = np.zeros(len(idx), dtype=bool)
+        if mode == "abs":
+            # Emulator.sbc_abs parses the byte as a HEX digit character
+            value = HEX_DIGIT[value]
+            bad = value < 0
+        ac = self.ac[idx]
+        minuend = np.where(ac & 0x80, ac - 256, ac)
+        subtrahend = np.where(value & 0x80, value - 256, value)
+        difference = minuend - subtrahend + (self.sr[idx] & C)
+        overflow = (difference < -128) | (difference > 127)
+        self.flag(idx, V, overflow)
+        self.sr[idx] = np.where(overflow, self.sr[idx] & ~C, self.sr[idx])
+        self.flag(idx, Z, difference == 0)
+        self.flag(idx, N, (difference < 0) | ((difference != 256) & ((difference & 0x80) != 0)))
+        bad |= (difference < 0) | (difference > 255)
+        self.ac[idx] = np.where(bad, self.ac[idx], difference)
+        return bad
+    return execute
+
+
+def compare(register, mode):
+    def execute(self, idx, pc):
+        value, _ = self.operand(idx, pc, mode)
+        data = getattr(self, register)[idx]
+        sr = self.sr[idx]
+        greater = data >= value
+        negative = (value & 0x80) != 0
+        sr = np.where(greater, (sr | C) & ~N,
+                      np.where(negative, sr & ~C | N, sr & ~N))
+        sr = np.where(data == value, sr | Z, sr)
+        self.sr[idx] = sr
+    return execute
+
+
+def bit(mode):
+    def execute(self, idx, pc):
+        value, _ = self.operand(idx, pc, mode)
+        self.flag(idx, V, value & 0x40)
+        self.flag(idx, N, value & 0x80)
+        self.flag(idx, Z, (self.ac[idx] & value) == 0)
+    return execute
+
+
+def modify(operation, mode):
+    def execute(self, idx, pc):
+        value, address = self.operand(idx, pc, mode)
+        result = operation(self, idx, value)
+        self.write(idx, address, result)
+    return execute
+
+
+def modify_accumulator(operation):
+    def execute(self, idx, pc):
+        self.ac[idx] = operation(self, idx, self.ac[idx])
+    return execute
+
+
+def increment(self, idx, value):
+    result = (value + 1) & 0xFF
+    self.zero_negative(idx, result)
+    return result
+
+
+def decrement(self, idx, value):
+    result = (value - 1) & 0xFF
+    self.zero_negative(idx, result)
+    return result
+
+
+def shift_left(self, idx, value):
+    self.flag(idx, C, value & 0x80)
+    result = (value << 1) & 0xFF
+    self.zero_negative(idx, result)
+    return result
+
+
+def shift_right(self, idx, value):
+    self.flag(idx, C, value & 1)
+    result = value >> 1
+    self.flag(idx, Z, result == 0)
+    return result
+
+
+def shift_right_accumulator(self, idx, value):
+    self.flag(idx, C, value & 1)
+    result = value >> 1
+    self.sr[idx] = np.where(result == 0, self.sr[idx] | Z, self.sr[idx])
+    return result
+
+
+def rotate_left(self, idx, value):
+    result = ((value & 0x7F) << 1) | (self.sr[idx] & C)
+    self.flag(idx, C, value & 0x80)
+    self.zero_negative(idx, result)
+    return result
+
+
+def rotate_right(self, idx, value):
+    result = (value >> 1) | ((self.sr[idx] & C) << 7)
+    self.flag(idx, C, value & 1)
+    self.zero_negative(idx, result)
+    return result
+
+
+def step_register(register, delta):
+    def execute(self, idx, pc):
+        values = getattr(self, register)
+        result = (values[idx] + delta) & 0xFF
+        values[idx] = result
+        self.zero_negative(idx, result)
+    return execute
+
+
+def inx(self, idx, pc):
+    x = self.x[idx] + 1
+    sign = (x & 0x80) != 0
+    self.flag(idx, N, sign)
+    self.flag(idx, Z, x == 0)
+    bad = x == 256
+    self.x[idx] = np.where(sign, 255, np.where(bad, self.x[idx], x))
+    return bad
+
+
+def transfer(source, dest, flags=True):
+    def execute(self, idx, pc):
+        value = getattr(self, source)[idx]
+        getattr(self, dest)[idx] = value
+        if flags:
+            self.zero_negative(idx, value)
+    return execute
+
+
+def set_flag(bit_value, on):
+    def execute(self, idx, pc):
+        if on:
+            self.sr[idx] |= bit_value
+        else:
+            self.sr[idx] &= ~bit_value
+    return execute
+
+
+def branch(bit_value, on):
+    def execute(self, idx, pc):
+        displacement = self.read(idx, np.full(len(idx), pc + 1))
+        offset = np.where(displacement & 0x80, displacement - 256, displacement)
+        taken = (self.sr[idx] & bit_value) != 0
+        if not on:
+            taken = ~taken
+        self.pc[idx] = np.where(taken, pc + 1 + offset, pc)
+    return execute
+
+
+def push(register):
+    def execute(self, idx, pc):
+        sp = self.sp[idx]
+        bad = sp < 1
+        self.write(idx, sp + 256, getattr(self, register)[idx])
+        self.sp[idx] = np.where(bad, sp, sp - 1)
+        return bad
+    return execute
+
+
+def pull(register):
+    def execute(self, idx, pc):
+        sp = self.sp[idx] + 1
+        bad = sp > 255
+        values = self.read(idx, sp + 256)
+        getattr(self, register)[idx] = np.where(bad, getattr(self, register)[idx], values)
+        self.sp[idx] = np.where(bad, self.sp[idx], sp)
+        return bad
+    return execute
+
+
+def jmp_abs(self, idx, pc):
+    _, address = self.operand(idx, pc, "abs")
+    self.pc[idx] = address - 1
+
+
+def jmp_ind(self, idx, pc):
+    _, address = self.operand(idx, pc, "abs")
+    self.pc[idx] = (self.read(idx, address) | (self.read(idx, address + 1) << 8)) - 1
+
+
+def jsr(self, idx, pc):
+    _, address = self.operand(idx, pc, "abs")
+    sp = self.sp[idx]
+    bad = sp < 2
+    self.write(idx, sp + 256, (pc + 2) & 0xFF)
+    self.write(idx, sp + 257, (pc + 2) >> 8)
+    self.sp[idx] = np.where(bad, sp, sp - 2)
+    self.pc[idx] = address - 1
+    return bad
+
+
+def rts(self, idx, pc):
+    sp = self.sp[idx] + 2
+    bad = sp > 255
+    self.pc[idx] = self.read(idx, sp + 256) | (self.read(idx, sp + 257) << 8)
+    self.sp[idx] = np.where(bad, self.sp[idx], sp)
+    return bad
+
+
+def brk(self, idx, pc):
+    sp = self.sp[idx]
+    bad = (sp < 3) | (pc + 2 > 0xFFFF)
+    self.write(idx, sp + 256, ((pc + 2) >> 8) & 0xFF)
+    self.write(idx, sp + 257, (pc + 2) & 0xFF)
+    sr = self.sr[idx] | I | B
+    self.write(idx, sp + 254, sr)
+    self.sp[idx] = np.where(bad, sp, sp - 3)
+    self.sr[idx] = sr
+    self.reason[idx] = STOP_BRK
+    return bad
+
+
+def nop(self, idx, pc):
+    pass
+
+
+def _build_dispatch():
+    """Maps every opcode of :attr:`Instructions.Instructions.instructions` to a vector handler."""
+    handlers = {}
+    for mode in ("imm", "zpg", "abs"):
+        handlers["LDA", mode] = load("ac", mode)
+        handlers["LDX", mode] = load("x", mode)
+        handlers["LDY", mode] = load("y", mode)
+        handlers["AND", mode] = logic(np.bitwise_and, mode)
+        handlers["ORA", mode] = logic(np.bitwise_or, mode)
+        handlers["EOR", mode] = logic(np.bitwise_xor, mode)
+        handlers["ADC", mode] = adc(mode)
+        handlers["SBC", mode] = sbc(mode)
+        handlers["CMP", mode] = compare("ac", mode)
+        handlers["CPX", mode] = compare("x", mode)
+        handlers["CPY", mode] = compare("y", mode)
+    for mode in ("zpg", "abs"):
+        handlers["STA", mode] = store("ac", mode)
+        handlers["STX", mode] = store("x", mode)
+        handlers["STY", mode] = store("y", mode)
+        handlers["BIT", mode] = bit(mode)
+        handlers["INC", mode] = modify(increment, mode)
+        handlers["DEC", mode] = modify(decrement, mode)
+        handlers["ASL", mode] = modify(shift_left, mode)
+        handlers["LSR", mode] = modify(shift_right, mode)
+        handlers["ROL", mode] = modify(rotate_left, mode)
+        handlers["ROR", mode] = modify(rotate_right, mode)
+
+    names = {
+        "asl": modify_accumulator(shift_left), "lsr": modify_accumulator(shift_right_accumulator),
+        "rol": modify_accumulator(rotate_left), "ror": modify_accumulator(rotate_right),
+        "bcc_rel": branch(C, False), "bcs_rel": branch(C, True),
+        "bne_rel": branch(Z, False), "beq_rel": branch(Z, True),
+        "bpl_rel": branch(N, False), "bmi_rel": branch(N, True),
+        "bvc": branch(V, False), "bvs": branch(V, True),
+        "clc": set_flag(C, False), "sec": set_flag(C, True),
+        "cld": set_flag(D, False), "sed": set_flag(D, True),
+        "cli": set_flag(I, False), "sei": set_flag(I, True), "clv": set_flag(V, False),
+        "inx": inx, "iny": step_register("y", 1),
+        "dex": step_register("x", -1), "dey": step_register("y", -1),
+        "tax": transfer("ac", "x"), "tay": transfer("ac", "y"), "tsx": transfer("sp", "x"),
+        "txa": transfer("x", "ac"), "tya": transfer("y", "ac"),
+        "txs": transfer("x", "sp", flags=False),
+        "pha": push("ac"), "php": push("sr"), "pla": pull("ac"), "plp": pull("sr"),
+        "jmp_abs": jmp_abs, "jmp_ind": jmp_ind, "jsr": jsr, "rts": rts,
+        "brk": brk, "nop": nop,
+    }
+    dispatch = {}
+    for op, function in Instructions.Instructions.instructions.items():
+        name = function.__name__
+        if name in names:
+            dispatch[int(op, 16)] = names[name]
+        else:
+            mnemonic, mode = name.split("_")
+            dispatch[int(op, 16)] = handlers[mnemonic.upper(), mode]
+    return dispatch
+
+
+DISPATCH = _build_dispatch()
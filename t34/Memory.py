@@ -3,11 +3,17 @@
     :synopsis: Memory class that maintains the T34 memory.
 """
 import logging
+import re
 from typing import ByteString, TypeVar
 
 logger = logging.getLogger(__name__)
 Address = TypeVar("Address", bound=int)
 
+# PC, AC, X, Y, SP and SR at power on
+INITIAL_REGISTERS = bytes([0, 0, 0, 0, 0, 0xFF, 0x20, 0])
+ZERO_MEMORY = bytes(65536)
+REGISTER_SLICES = {"PC": (0, 2), "AC": (2, 3), "X": (3, 4), "Y": (4, 5), "SP": (5, 6), "SR": (6, 7)}
+
 
 class Memory:
     """Memory class that maintains the T34 registers and memory."""
@@ -15,9 +21,29 @@ class Memory:
     def __init__(self):
         """Initialize all of the Emulator's memory."""
         self.memory = bytearray(65536)
-        self.registers = bytearray(7)
+        self.registers = bytearray(len(INITIAL_REGISTERS))
+        self.dirty = bytearray(32)
         self.initialize_registers()
 
+    def __getstate__(self) -> dict:
+        """Only the memory, registers and dirty pages are pickled."""
+        return {"memory": self.memory, "registers": self.registers, "dirty": self.dirty}
+
+    def __setstate__(self, state: dict):
+        """Restore the state saved by __getstate__."""
+        self.__dict__.update(state)
+
+    def clone(self):
+        """Copy the machine state into a new instance with one copy per bytearray.
+
+        Returns:
+            Memory -- independent copy of this instance
+        """
+        other = self.__class__.__new__(self.__class__)
+        other.__setstate__({key: bytearray(value) if isinstance(value, bytearray) else value
+                            for key, value in self.__getstate__().items()})
+        return other
+
     def initialize_registers(self):
         """
         Initialize registers to initial values.
@@ -29,11 +55,26 @@ class Memory:
         SP: 0xFF
         SR: 0x20
         """
-        self.registers = bytearray([0, 0, 0, 0, 0, 0, 0, 0])
-        sp = int(self.registers[5:6].hex(), 16) | 255
-        self.registers[5:6] = sp.to_bytes(1, byteorder='big')
-        sr = ~int(self.registers[6:7].hex(), 16) & (1 << 5)
-        self.registers[6:7] = sr.to_bytes(1, byteorder='big')
+        self.registers[:] = INITIAL_REGISTERS
+
+    def reset(self, clear_memory=True):
+        """
+        Restores the registers and clears memory in place.
+
+        Arguments:
+            clear_memory {bool or list} -- True to zero all of memory and the dirty pages,
+                False to keep memory, or (start, end) ranges to zero, end exclusive
+        """
+        self.initialize_registers()
+        if clear_memory is True:
+            self.memory[:] = ZERO_MEMORY
+            self.clear_dirty()
+        elif clear_memory:
+            zero = memoryview(ZERO_MEMORY)
+            for start, end in clear_memory:
+                end = min(end, len(self.memory))
+                self.memory[start:end] = zero[:end-start]
+                self.mark_dirty(start, end)
 
     def read_memory(self, start: Address, end: Address):
         """
@@ -60,6 +101,171 @@ class Memory:
         except:
             data = data.to_bytes(1, byteorder='big')
             self.memory[start:start+len(data)] = data
+        self.mark_dirty(start, start+len(data))
+
+    def fill_memory(self, start: Address, end: Address, data: ByteString):
+        """
+        Fills [start, end) with a byte pattern repeated as often as needed.
+
+        Arguments:
+            start {Address} -- first address to fill
+            end {Address} -- address one past the last filled byte
+            data {ByteString} -- pattern to repeat
+        """
+        if start < 0 or end > len(self.memory) or not data:
+            raise ValueError("cannot fill %X-%X" % (start, end))
+        size = end - start
+        self.memory[start:end] = (bytes(data) * (size // len(data) + 1))[:size]
+        self.mark_dirty(start, end)
+
+    def move_memory(self, dest: Address, start: Address, end: Address):
+        """
+        Copies [start, end) to dest. Overlapping ranges are copied as if through a buffer.
+
+        Arguments:
+            dest {Address} -- first address of the copy
+            start {Address} -- first address to copy
+            end {Address} -- address one past the last copied byte
+        """
+        size = end - start
+        if start < 0 or dest < 0 or end > len(self.memory) or dest + size > len(self.memory):
+            raise ValueError("cannot move %X-%X to %X" % (start, end, dest))
+        self.memory[dest:dest+size] = self.memory[start:end]
+        self.mark_dirty(dest, dest+size)
+
+    def mark_dirty(self, start: Address, end: Address):
+        """Mark every page touched by the range [start, end) as dirty.
+
+        Arguments:
+            start {Address} -- first address written
+            end {Address} -- address one past the last byte written
+        """
+        page = start >> 8
+        last = (end - 1) >> 8
+        while page <= last:
+            self.dirty[(page >> 3) & 31] |= 1 << (page & 7)
+            page += 1
+
+    def page_isDirty(self, page: int) -> bool:
+        """
+        Checks if a page has been written since the last clear.
+
+        Arguments:
+            page {int} -- page number (high byte of the address)
+
+        Returns:
+            Bool -- status of the page
+        """
+        return bool(self.dirty[page >> 3] & (1 << (page & 7)))
+
+    def dirty_pages(self) -> list:
+        """Retrieve the pages written since the last clear.
+
+        Returns:
+            list -- sorted page numbers
+        """
+        pages = []
+        for index, bits in enumerate(self.dirty):
+            if bits:
+                pages.extend((index << 3) + bit for bit in range(8) if bits & (1 << bit))
+        return pages
+
+    def clear_dirty(self):
+        """Clear the dirty-page bitmap."""
+        self.dirty[:] = bytes(32)
+
+    def snapshot(self) -> bytes:
+        """Copy the memory image and start a new dirty-page window.
+
+        Returns:
+            bytes -- copy of the full memory
+        """
+        self.clear_dirty()
+        return bytes(self.memory)
+
+    def diff_memory(self, old: ByteString, new: ByteString = None, pages: list = None) -> list:
+        """Compare two memory images and collect the runs of changed bytes.
+
+        Whole pages are compared at once and only pages that differ are
+        scanned byte by byte.
+
+        Arguments:
+            old {ByteString} -- earlier memory image
+            new {ByteString} -- later memory image, defaults to the current memory
+            pages {list} -- pages to compare, defaults to all of them
+
+        Returns:
+            list -- (address, old bytes, new bytes) for each run of changes
+        """
+        if new is None:
+            new = self.memory
+        if pages is None:
+            pages = range(256)
+        old = memoryview(old)
+        new = memoryview(new)
+
+        runs = []
+        run_start = None
+        run_end = None
+        for page in pages:
+            start = page << 8
+            if old[start:start+256] == new[start:start+256]:
+                continue
+            for address in range(start, start+256):
+                if old[address] == new[address]:
+                    continue
+                if address != run_end:
+                    if run_start is not None:
+                        runs.append((run_start, bytes(old[run_start:run_end]),
+                                     bytes(new[run_start:run_end])))
+                    run_start = address
+                run_end = address + 1
+        if run_start is not None:
+            runs.append((run_start, bytes(old[run_start:run_end]),
+                         bytes(new[run_start:run_end])))
+        return runs
+
+    def search_memory(self, pattern: ByteString, mask: ByteString = None,
+                      start: Address = 0, end: Address = None) -> list:
+        """Find every address in [start, end) where a byte pattern matches.
+
+        Exact patterns are found with bytearray.find. Masked patterns only
+        compare the bits set in the mask and are compiled into one regular
+        expression over memory. Overlapping matches are all reported.
+
+        Arguments:
+            pattern {ByteString} -- bytes to look for
+            mask {ByteString} -- bits of each pattern byte that must match, defaults to all
+            start {Address} -- first address to search
+            end {Address} -- address one past the last searched byte
+
+        Returns:
+            list -- addresses of the matches
+        """
+        if end is None:
+            end = len(self.memory)
+        if not pattern:
+            return []
+
+        if mask is None or all(m == 0xFF for m in mask):
+            matches = []
+            address = self.memory.find(pattern, start, end)
+            while address != -1:
+                matches.append(address)
+                address = self.memory.find(pattern, address + 1, end)
+            return matches
+
+        expression = b""
+        for value, m in zip(pattern, mask):
+            if m == 0xFF:
+                expression += re.escape(bytes([value]))
+            elif m == 0:
+                expression += b"."
+            else:
+                expression += b"[" + b"".join(
+                    re.escape(bytes([v])) for v in range(256) if v & m == value & m) + b"]"
+        expression = re.compile(b"(?=" + expression + b")", re.DOTALL)
+        return [match.start() for match in expression.finditer(self.memory, start, end)]
 
     def write_PC(self, value: int):
         """Write to the PC register.
@@ -163,6 +369,25 @@ class Memory:
         """
         return int(self.registers[6:7].hex(), 16)
 
+    def get_registers(self) -> dict:
+        """Retrieve the contents of every register.
+
+        Returns:
+            dict -- register name to value
+        """
+        return {"PC": self.get_PC(), "AC": self.get_AC(), "X": self.get_X(),
+                "Y": self.get_Y(), "SP": self.get_SP(), "SR": self.get_SR()}
+
+    def set_registers(self, values: dict):
+        """Write registers directly, without touching the flags.
+
+        Arguments:
+            values {dict} -- register name to value, as returned by get_registers
+        """
+        for name, value in values.items():
+            start, end = REGISTER_SLICES[name]
+            self.registers[start:end] = value.to_bytes(end - start, byteorder='big')
+
     def check_carry(self, value: int) -> bool:
         if value > 256:
             self.set_carry()
@@ -340,6 +565,7 @@ class Memory:
         data = data.to_bytes(size, byteorder='little')
         logger.debug("Pushing " + str(data) + " onto stack")
         self.memory[sp:sp+size] = data[:]
+        self.mark_dirty(sp, sp+size)
         logger.debug(self.memory[sp:sp+size])
         sp -= size
         sp -= 256
@@ -0,0 +1,166 @@
+"""
+.. module:: Profiler
+    :synopsis: Call-graph profiler following JSR and RTS with a shadow call stack.
+"""
+import logging
+from . import Instructions
+logger = logging.getLogger(__name__)
+
+STEPS = "steps"
+CYCLES = "cycles"
+
+JSR = next(int(op, 16) for op, function in Instructions.Instructions.instructions.items()
+           if function.__name__ == "jsr")
+RTS = next(int(op, 16) for op, function in Instructions.Instructions.instructions.items()
+           if function.__name__ == "rts")
+
+
+class Profiler:
+    """
+    Keeps a tree of the call paths taken through JSR and RTS and charges every instruction to
+    the path it ran on.
+
+    Every node of the tree is a subroutine reached by one call path. The current node is
+    followed from JSR to its target and back on RTS, so charging an instruction is one list
+    update.
+    """
+
+    def __init__(self, unit=CYCLES):
+        """
+        Creates an empty profile.
+
+        :param str unit: ``steps`` to count instructions or ``cycles`` to count cycles.
+        """
+        self.unit = unit
+        self.parents = []
+        self.addresses = []
+        self.children = []
+        self.exclusive = []
+        self.calls = []
+        self.roots = {}
+        self.current = None
+
+    def unwind(self):
+        """Forgets the shadow call stack, so the next instruction starts a new call path."""
+        self.current = None
+
+    def node(self, parent, address):
+        """
+        Finds or adds the node for a subroutine called from another node.
+
+        :param int parent: node of the caller, or None for the root.
+        :param int address: address of the subroutine.
+
+        :return: number of the node.
+        :rtype: int
+        """
+        calls = self.roots if parent is None else self.children[parent]
+        if address in calls:
+            return calls[address]
+        number = len(self.addresses)
+        self.parents.append(parent)
+        self.addresses.append(address)
+        self.children.append({})
+        self.exclusive.append(0)
+        self.calls.append(0)
+        calls[address] = number
+        return number
+
+    def record(self, machine, pc, cycles):
+        """
+        Charges the instruction at an address to the current call path and follows JSR and RTS.
+        Called before the instruction runs.
+
+        :param Memory machine: machine about to run the instruction.
+        :param int pc: address of the instruction.
+        :param int cycles: cycles the instruction takes.
+        """
+        memory = machine.memory
+        current = self.current
+        if current is None:
+            current = self.current = self.node(None, pc)
+        self.exclusive[current] += 1 if self.unit == STEPS else cycles
+        op = memory[pc]
+        if op == JSR:
+            current = self.current = self.node(current, memory[pc + 1] | (memory[pc + 2] << 8))
+            self.calls[current] += 1
+        elif op == RTS and self.parents[current] is not None:
+            self.current = self.parents[current]
+
+    def path(self, number):
+        """
+        Lists the subroutines on the call path to a node, outermost first.
+
+        :param int number: node.
+
+        :return: subroutine addresses.
+        :rtype: list
+        """
+        addresses = []
+        while number is not None:
+            addresses.append(self.addresses[number])
+            number = self.parents[number]
+        return addresses[::-1]
+
+    def inclusive(self):
+        """
+        Totals every node together with all of the nodes it called. Nodes are numbered after
+        their callers, so one pass from the last node up is enough.
+
+        :return: inclusive count of every node.
+        :rtype: list
+        """
+        totals = list(self.exclusive)
+        for number in range(len(totals) - 1, -1, -1):
+            if self.parents[number] is not None:
+                totals[self.parents[number]] += totals[number]
+        return totals
+
+    def subroutines(self):
+        """
+        Sums the profile by subroutine. Recursive calls are only counted once in the inclusive
+        total of a subroutine.
+
+        :return: address to (inclusive, exclusive, calls) for every subroutine.
+        :rtype: dict
+        """
+        totals = self.inclusive()
+        summary = {}
+        for number, address in enumerate(self.addresses):
+            inclusive, exclusive, calls = summary.get(address, (0, 0, 0))
+            if address not in self.path(number)[:-1]:
+                inclusive += totals[number]
+            summary[address] = (inclusive, exclusive + self.exclusive[number],
+                                calls + self.calls[number])
+        return summary
+
+    def folded(self, name=None):
+        """
+        Formats the profile as folded stacks, one ``caller;callee count`` line per call path,
+        as read by flamegraph tools.
+
+        :param name: function giving the name of a subroutine address, defaults to HEX.
+
+        :return: the folded stacks.
+        :rtype: generator
+        """
+        name = name or "{:04X}".format
+        for number, count in enumerate(self.exclusive):
+            if count:
+                yield "%s %d\n" % (";".join(name(address) for address in self.path(number)), count)
+
+    def report(self, name=None):
+        """
+        Formats the profile by subroutine, most inclusive first.
+
+        :param name: function giving the name of a subroutine address, defaults to HEX.
+
+        :return out: a table of inclusive and exclusive counts and calls.
+        :rtype: string
+        """
+        name = name or "{:04X}".format
+        output = "%-16s %12s %12s %8s\n" % ("SUBROUTINE", "INCLUSIVE", "EXCLUSIVE", "CALLS")
+        rows = sorted(self.subroutines().items(), key=lambda item: -item[1][0])
+        for address, (inclusive, exclusive, calls) in rows:
+            output += "%-16s %12d %12d %8d\n" % (name(address), inclusive, exclusive, calls)
+        return output
@@ -0,0 +1,137 @@
+"""
+.. module:: Recorder
+    :synopsis: Flight recorder keeping the last trace records of a run in a fixed-size ring.
+"""
+import logging
+from . import Instructions
+logger = logging.getLogger(__name__)
+
+# Bytes per record: PC high and low, the instruction's three bytes and AC, X, Y, SP, SR
+RECORD_SIZE = 10
+
+HEADER = " PC  OPC  INS   AMOD OPRND  AC XR YR SP NV-BDIZC\n"
+
+ACCUMULATOR = ("asl", "lsr", "rol", "ror")
+RELATIVE = ("bvc", "bvs")
+
+
+def _decode():
+    """Builds the name, addressing mode and operand count of every opcode for the trace."""
+    table = {}
+    for op, function in Instructions.Instructions.instructions.items():
+        name, _, mode = function.__name__.partition("_")
+        if mode in ("imm", "zpg", "rel") or name in RELATIVE:
+            count = 1
+        elif mode in ("abs", "ind") or name == "jsr":
+            count = 2
+        else:
+            count = 0
+        if mode == "imm":
+            mode = "#"
+        elif name in ACCUMULATOR and not mode:
+            mode = "A"
+        elif name in RELATIVE:
+            mode = "rel"
+        elif name == "jsr":
+            mode = "abs"
+        elif not mode:
+            mode = "impl"
+        table[int(op, 16)] = (name.upper(), mode, count)
+    return table
+
+
+DECODE = _decode()
+
+
+class FlightRecorder:
+    """
+    Ring of the last trace records of a run, kept as 10 byte binary records in one
+    preallocated bytearray and only formatted when dumped.
+
+    A record is written before its instruction runs and holds the registers from before it; the
+    registers after an instruction are the ones in the next record, or the machine's own for
+    the newest record.
+    """
+
+    def __init__(self, capacity, out):
+        """
+        Creates an empty recorder.
+
+        :param int capacity: number of instructions kept.
+        :param out: writer the records are dumped to.
+        """
+        self.capacity = capacity
+        self.out = out
+        self.records = bytearray(RECORD_SIZE * capacity)
+        self.head = 0
+        self.size = 0
+
+    def __len__(self):
+        return self.size
+
+    def clear(self):
+        """Forgets every record."""
+        self.head = 0
+        self.size = 0
+
+    def record(self, machine, pc):
+        """
+        Records the instruction at an address. Called before it runs.
+
+        :param Memory machine: machine about to run the instruction.
+        :param int pc: address of the instruction.
+        """
+        offset = self.head * RECORD_SIZE
+        records = self.records
+        records[offset] = pc >> 8
+        records[offset + 1] = pc & 0xFF
+        records[offset + 2:offset + 5] = machine.memory[pc:pc + 3].ljust(3, b"\0")
+        records[offset + 5:offset + 10] = machine.registers[2:7]
+        self.head = self.head + 1 if self.head + 1 < self.capacity else 0
+        if self.size < self.capacity:
+            self.size += 1
+
+    def lines(self, machine, symbols=None):
+        """
+        Formats the records, oldest first, as the lines of a trace.
+
+        :param Memory machine: machine the records were taken from.
+        :param Symbols.SymbolTable symbols: labels to end every line with the address's name.
+
+        :return: trace lines, each ending in a newline.
+        :rtype: generator
+        """
+        records = self.records
+        first = (self.head - self.size) % self.capacity
+        for number in range(self.size):
+            offset = (first + number) % self.capacity * RECORD_SIZE
+            if number + 1 < self.size:
+                after = (first + number + 1) % self.capacity * RECORD_SIZE + 5
+                registers = records[after:after + 5]
+            else:
+                registers = machine.registers[2:7]
+            pc = (records[offset] << 8) | records[offset + 1]
+            op = records[offset + 2]
+            name, mode, count = DECODE.get(op, ("???", "", 0))
+            operands = ["%02X" % records[offset + 3 + index] if index < count else "--"
+                        for index in range(2)]
+            line = "%4.1X  %02X  %s   %4s %s %s  %02X %02X %02X %02X %s" % (
+                pc, op, name, mode, operands[0], operands[1], registers[0], registers[1],
+                registers[2], registers[3], format(registers[4], "08b"))
+            if symbols is not None:
+                line += "  " + symbols.name(pc)
+            yield line + "\n"
+
+    def dump(self, machine, reason, pc, symbols=None):
+        """
+        Writes the records and why they were dumped.
+
+        :param Memory machine: machine the records were taken from.
+        :param str reason: why the run stopped.
+        :param int pc: address of the next instruction.
+        :param Symbols.SymbolTable symbols: labels to name the addresses with.
+        """
+        self.out.write("Flight recorder: %s at %X, last %d instructions\n" % (reason, pc, self.size))
+        self.out.write(HEADER)
+        self.out.writelines(self.lines(machine, symbols))
+        self.out.flush()
@@ -0,0 +1,148 @@
+"""
+.. module:: Symbols
+    :synopsis: Symbol tables read from label files or assembler listings.
+
+Two formats are read, and can be mixed in one file:
+
+* assignments such as ``loop = $0304`` (or ``loop EQU $0304``), one per line;
+* assembler listings, whose lines start with the HEX address and the bytes assembled there,
+  followed by the source line, such as ``0304  CA        loop:  DEX``. A label is either
+  followed by a colon or is not an instruction name.
+
+Anything after a ``;`` is a comment. Lines in neither format are skipped.
+"""
+import bisect
+import logging
+import re
+from . import Instructions
+logger = logging.getLogger(__name__)
+
+ASSIGNMENT = re.compile(r"^\s*([A-Za-z_.@][\w.@]*)\s*(?:=|\s[Ee][Qq][Uu]\s)\s*\$([0-9A-Fa-f]{1,4})\s*$")
+
+LISTING = re.compile(r"^\s*([0-9A-Fa-f]{4}):?((?:\s+[0-9A-Fa-f]{2}(?![\w.@:]))*)\s+([A-Za-z_.@][\w.@]*)(:?)")
+
+MNEMONICS = frozenset(function.__name__.partition("_")[0].upper()
+                      for function in Instructions.Instructions.instructions.values())
+
+
+def parse(lines):
+    """
+    Reads the labels defined by lines of a label file or an assembler listing.
+
+    :param lines: iterable of lines.
+
+    :return: (label, address) for every label, in the order they are defined.
+    :rtype: generator
+    """
+    for line in lines:
+        line = line.partition(";")[0]
+        match = ASSIGNMENT.match(line)
+        if match:
+            yield match.group(1), int(match.group(2), 16)
+            continue
+        match = LISTING.match(line)
+        if match and (match.group(4) or match.group(3).upper() not in MNEMONICS) \
+                and not match.group(3).startswith("."):
+            yield match.group(3), int(match.group(1), 16)
+
+
+def load(path):
+    """
+    Reads a symbol table from a label file or an assembler listing.
+
+    :param str path: name of the file.
+
+    :return: the symbols in it.
+    :rtype: SymbolTable
+    """
+    with open(path) as symbol_file:
+        return SymbolTable(parse(symbol_file))
+
+
+class SymbolTable:
+    """
+    Labels sorted by address, so the label at or before any address is found with one
+    bisection. Names are remembered once found, so annotating every line of a long trace costs
+    one dictionary lookup per line.
+    """
+
+    def __init__(self, symbols=()):
+        """
+        Creates a symbol table. When several labels share an address, the first one names it.
+
+        :param symbols: iterable of (label, address).
+        """
+        self.labels = {}
+        first = {}
+        for label, address in symbols:
+            self.labels[label.upper()] = address
+            first.setdefault(address, label)
+        self.addresses = sorted(first)
+        self.names = [first[address] for address in self.addresses]
+        self.found = {}
+
+    def __len__(self):
+        return len(self.addresses)
+
+    def lookup(self, address):
+        """
+        Finds the nearest label at or before an address.
+
+        :param int address: address to look up.
+
+        :return: (label, offset from the label), or None when no label comes before it.
+        :rtype: tuple
+        """
+        index = bisect.bisect_right(self.addresses, address) - 1
+        if index < 0:
+            return None
+        return self.names[index], address - self.addresses[index]
+
+    def name(self, address):
+        """
+        Names an address as its nearest label plus an offset.
+
+        :param int address: address to name.
+
+        :return: ``label`` or ``label+offset`` with the offset in HEX, or the HEX address when
+            no label comes before it.
+        :rtype: string
+        """
+        name = self.found.get(address)
+        if name is None:
+            symbol = self.lookup(address)
+            if symbol is None:
+                name = "%04X" % address
+            elif symbol[1]:
+                name = "%s+%X" % symbol
+            else:
+                name = symbol[0]
+            self.found[address] = name
+        return name
+
+    def address(self, text):
+        """
+        Reads an address given as a label, a label plus a HEX offset or in HEX. Labels are
+        matched ignoring case.
+
+        :param str text: such as ``loop``, ``loop+2`` or ``304``.
+
+        :return: the address.
+        :rtype: int
+
+        :raises ValueError: if the text is neither a label nor a HEX number.
+        """
+        label, _, offset = text.strip().partition("+")
+        if label.upper() in self.labels:
+            return (self.labels[label.upper()] + int(offset or "0", 16)) & 0xFFFF
+        return int(text, 16)
+
+    def listing(self):
+        """
+        Formats the table, one ``address  label`` line per label, in address order.
+
+        :return out: the labels.
+        :rtype: string
+        """
+        return "".join("%04X  %s\n" % (address, name)
+                       for address, name in zip(self.addresses, self.names))
@@ -0,0 +1,58 @@
+"""
+.. module:: TestBatch
+"""
+import unittest
+import t34
+from t34 import Batch
+from t34 import Emulator as emulator
+from t34.Emulator import Emulator
+
+
+class TestBatch(unittest.TestCase):
+    """Unit testing class for the batch runner in the Batch module."""
+
+    def test_parse_task(self):
+        """Test parsing a line of a batch file."""
+        task = Batch.parse_task("test.txt 200 1000:0102 20:FF\n")
+        self.assertEqual(task, Batch.Task("test.txt", "200", ((0x1000, b"\x01\x02"), (0x20, b"\xFF"))))
+        self.assertIsNone(Batch.parse_task("# comment\n"))
+        self.assertIsNone(Batch.parse_task("\n"))
+
+    def test_run_task_reuses_emulator(self):
+        """Test that a reused emulator starts every task from a clean state."""
+        em = Emulator()
+        options = {"max_steps": 100}
+        first = Batch.run_task(Batch.Task(None, "300", ((0x300, b"\xA9\x05\x85\x10\x00"),)), em, options)
+        second = Batch.run_task(Batch.Task(None, "300", ((0x300, b"\xEA\x00"),)), em, options)
+        self.assertEqual(first.reason, emulator.BRK)
+        self.assertEqual(first.registers, bytes([0x03, 0x04, 0x05, 0, 0, 0xFC, 0x34]))
+        self.assertEqual(second.registers, bytes([0x03, 0x01, 0, 0, 0, 0xFC, 0x34]))
+        self.assertEqual(em.memory[0x10], 0)
+
+    def test_run_batch(self):
+        """Test running tasks across worker processes."""
+        tasks = [Batch.Task("test.txt", "200"), Batch.Task(None, "300", ((0x300, b"\xEA\x00"),))]
+        results = Batch.run_batch(tasks, workers=2, digest=True, max_steps=50)
+        self.assertEqual([result.reason for result in results], [emulator.MAX_STEPS, emulator.BRK])
+        self.assertEqual(results[0].steps, 50)
+        self.assertEqual(len(results[1].digest), 32)
+
+    def test_run_batch_error(self):
+        """Test that a task raising in a worker ends with an error and the others still run."""
+        tasks = [Batch.Task(None, "300", ((0x300, b"\xEA\x00"),)),
+                 Batch.Task(None, "300", ((0x300, b"\xE5\x10\x00"),)),
+                 Batch.Task("missing.txt", "300"),
+                 Batch.Task(None, "XYZ")]
+        results = Batch.run_batch(tasks, workers=2)
+        self.assertEqual([result.reason for result in results],
+                         [emulator.BRK, emulator.ERROR, emulator.ERROR, emulator.ERROR])
+        self.assertEqual([result.start for result in results], [0x300, 0x300, 0x300, None])
+        self.assertIsNone(results[0].error)
+        self.assertTrue(results[1].error.startswith("TypeError"))
+        self.assertEqual((results[1].steps, results[1].start), (0, 0x300))
+        self.assertTrue(results[2].error.startswith("FileNotFoundError"))
+        self.assertTrue(results[3].error.startswith("ValueError"))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,72 @@
+"""
+.. module:: TestCache
+"""
+import os
+import tempfile
+import unittest
+import t34
+from t34 import Cache
+from t34.Memory import Memory
+
+
+class TestCache(unittest.TestCase):
+    """Unit testing class for the decoded program cache in the Cache module."""
+
+    def setUp(self):
+        """Setup a disk backed cache and a program to load through it."""
+        self.directory = tempfile.TemporaryDirectory()
+        self.cache = Cache.ProgramCache(os.path.join(self.directory.name, "cache"))
+        self.program = os.path.join(self.directory.name, "program.hex")
+        with open(self.program, "w") as f:
+            f.write(":03030000A9010050\n:0103100042AA\n:00000001FF\n")
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_load(self):
+        """Test that a cached load writes the same memory as the loader."""
+        memory = Memory()
+        self.cache.load(memory, self.program)
+        self.assertEqual(memory.memory[0x300:0x303], bytes([0xA9, 0x01, 0x00]))
+        self.assertEqual(memory.memory[0x310], 0x42)
+        self.assertEqual(memory.memory[0x303:0x310], bytes(13))
+
+    def test_load_hit(self):
+        """Test that a second load reuses the decoded image."""
+        self.cache.load(Memory(), self.program)
+        segments = self.cache.images[self.cache.files[(self.program, 0)][2]]
+        memory = Memory()
+        self.cache.load(memory, self.program)
+        self.assertEqual(len(self.cache.images), 1)
+        self.assertIs(self.cache.images[self.cache.files[(self.program, 0)][2]], segments)
+        self.assertEqual(memory.memory[0x310], 0x42)
+
+    def test_load_from_disk(self):
+        """Test that a fresh cache finds the image decoded by another cache."""
+        self.cache.load(Memory(), self.program)
+        cache = Cache.ProgramCache(self.cache.directory)
+        digest = cache.digest(self.program, 0)
+        self.assertEqual(cache.get(digest), self.cache.images[digest])
+
+    def test_changed_program(self):
+        """Test that editing the program invalidates the cached image."""
+        self.cache.load(Memory(), self.program)
+        with open(self.program, "w") as f:
+            f.write(":0103000042BA\n:00000001FF\n")
+        os.utime(self.program, ns=(0, 0))
+        memory = Memory()
+        self.cache.load(memory, self.program)
+        self.assertEqual(memory.memory[0x300:0x302], bytes([0x42, 0x00]))
+
+    def test_eviction(self):
+        """Test that the least recently used image is evicted past the cap."""
+        self.cache.max_bytes = 4
+        self.cache.put("a", ((0, b"\x01\x02"),))
+        self.cache.put("b", ((0, b"\x03\x04"),))
+        self.cache.get("a")
+        self.cache.put("c", ((0, b"\x05"),))
+        self.assertEqual(list(self.cache.images), ["a", "c"])
+
+
+if __name__ == '__main__':
+    unittest.main()
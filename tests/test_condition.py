@@ -0,0 +1,41 @@
+"""
+.. module:: TestCondition
+"""
+import unittest
+from t34.Condition import compile_condition
+from t34.Memory import Memory
+
+
+class TestCondition(unittest.TestCase):
+    """Unit testing class for the breakpoint conditions in the Condition module."""
+
+    def setUp(self):
+        self.memory = Memory()
+        self.memory.set_registers({"AC": 0x10, "X": 2, "SR": 0x81})
+        self.memory.write_memory(0x07, bytes([4]))
+
+    def check(self, source, pc=0x300):
+        """Evaluates a condition against the test machine."""
+        return compile_condition(source)(pc, self.memory.registers, self.memory.memory)
+
+    def test_registers_and_memory(self):
+        """Test conditions over registers and memory."""
+        self.assertTrue(self.check("A == 0x10 and mem[0x07] > 3"))
+        self.assertFalse(self.check("ac == 0x10 and mem[0x06 + X] > 3"))
+        self.assertTrue(self.check("PC == 0x300 or Y"))
+
+    def test_flags(self):
+        """Test conditions over the status flags."""
+        self.assertTrue(self.check("N and C and not Z"))
+        self.assertFalse(self.check("V or SR & 0x02"))
+
+    def test_invalid(self):
+        """Test rejecting conditions that are not expressions over the machine state."""
+        for source in ("A ==", "open('x')", "Q == 1", "mem", "'A' == A", "[A][0] == 1",
+                       "A.real == 1", "(lambda: 1)()"):
+            with self.assertRaises(ValueError, msg=source):
+                compile_condition(source)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,66 @@
+"""
+.. module:: TestCoverage
+"""
+import os
+import tempfile
+import unittest
+from concurrent.futures import ProcessPoolExecutor
+from t34 import Coverage
+from t34.Emulator import Emulator
+
+
+def save_address(path, address):
+    """Merges a bitmap covering a single address into a coverage file."""
+    bitmap = bytearray(Coverage.SIZE)
+    bitmap[address] = 1
+    Coverage.save(path, bitmap, merge_existing=True)
+
+
+class TestCoverage(unittest.TestCase):
+    """Unit testing class for the coverage bitmaps in the Coverage module."""
+
+    def setUp(self):
+        self.first = bytearray(Coverage.SIZE)
+        self.first[0x300] = 1
+        self.second = bytearray(Coverage.SIZE)
+        self.second[0x302] = 1
+        self.second[0xFFFF] = 1
+
+    def test_merge(self):
+        """Test combining coverage with a bitwise OR."""
+        merged = Coverage.merge((self.first, self.second))
+        self.assertEqual(len(merged), Coverage.SIZE)
+        self.assertEqual([address for address, hit in enumerate(merged) if hit], [0x300, 0x302, 0xFFFF])
+
+    def test_save_merge_existing(self):
+        """Test merging coverage into a file from an earlier run."""
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "coverage.bin")
+            Coverage.save(path, self.first, merge_existing=True)
+            Coverage.save(path, self.second, merge_existing=True)
+            self.assertEqual(Coverage.load(path), Coverage.merge((self.first, self.second)))
+
+    @unittest.skipIf(Coverage.fcntl is None, "needs fcntl")
+    def test_save_merge_concurrent(self):
+        """Test that processes merging into one file at once keep all of their coverage."""
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "coverage.bin")
+            addresses = range(0x300, 0x300 + 200)
+            with ProcessPoolExecutor(8) as pool:
+                list(pool.map(save_address, [path] * len(addresses), addresses))
+            bitmap = Coverage.load(path)
+            self.assertEqual([address for address, hit in enumerate(bitmap) if hit], list(addresses))
+
+    def test_report(self):
+        """Test counting the instructions and bytes covered in a range."""
+        emulator = Emulator()
+        emulator.edit_memory("300", "A9 05 8D 00 10 EA 00")
+        bitmap = Coverage.merge((self.first, self.second))
+        rows = Coverage.report(bitmap, [(0x300, 0x307), (0x304, 0x305)], emulator.memory)
+        self.assertEqual(rows, [(0x300, 0x307, 2, 5), (0x304, 0x305, 0, 0)])
+        self.assertEqual(Coverage.format_report(rows[:1]),
+                         "300.306\t2 instructions, 5 of 7 bytes (71.4%)\n")
+
+
+if __name__ == '__main__':
+    unittest.main()
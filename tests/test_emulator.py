@@ -1,8 +1,13 @@
 """
 .. module:: TestEmulator
 """
+import io
+import os
+import pickle
+import tempfile
 import unittest
 import t34
+from t34 import Emulator as emulator
 from t34.Emulator import Emulator
 
 
@@ -24,6 +29,18 @@ class TestEmulator(unittest.TestCase):
         self.assertEqual(
             output, "200\tA9 00 85 00 A5 00 8D 00\n208\t80 E6 00 4C 04 02 00 00\n")
 
+    def test_access_memory_range_width(self):
+        """Test access to a memory address range with 16 bytes per line."""
+        output = self.emulator.access_memory_range("201", "212", 16)
+        self.assertEqual(
+            output, "201\t00 85 00 A5 00 8D 00 80 E6 00 4C 04 02 00 00 00\n211\t00 00\n")
+
+    def test_dump_memory_range(self):
+        """Test streaming a memory range dump to a sink."""
+        sink = io.StringIO()
+        self.emulator.dump_memory_range("200", "20F", sink)
+        self.assertEqual(sink.getvalue(), self.emulator.access_memory_range("200", "20F"))
+
     def test_edit_memory_locations(self):
         """Test edit of a memory location."""
         self.emulator.edit_memory(
@@ -33,6 +50,325 @@ class TestEmulator(unittest.TestCase):
         self.assertEqual(
             output, "300\tA9 04 85 07 A0 00 84 06\n308\tA9 A0 91 06 C8 D0 FB E6\n310\t07\n")
 
+    def test_memory_diff(self):
+        """Test listing the memory changed since a snapshot."""
+        self.emulator.take_snapshot()
+        self.emulator.edit_memory("300", "A9 04")
+        self.emulator.edit_memory("200", "A9")
+        output = self.emulator.memory_diff()
+        self.assertEqual(output, "300\t00 00 -> A9 04\n")
+
+    def test_fill_memory_range(self):
+        """Test filling a memory range."""
+        self.emulator.fill_memory_range("1000", "1009", "EA 00")
+        output = self.emulator.access_memory_range("1000", "100A")
+        self.assertEqual(output, "1000\tEA 00 EA 00 EA 00 EA 00\n1008\tEA 00 00\n")
+
+    def test_move_memory_range(self):
+        """Test copying a memory range to another address."""
+        self.emulator.move_memory_range("300", "200", "20D")
+        self.assertEqual(self.emulator.memory[0x300:0x30E], self.emulator.memory[0x200:0x20E])
+
+    def test_search_memory_command(self):
+        """Test searching memory for HEX bytes with wildcards."""
+        self.assertEqual(self.emulator.search_memory_command("A9 00"), "200\n")
+        self.assertEqual(self.emulator.search_memory_command("?5 00"), "202\n204\n")
+        self.assertEqual(self.emulator.search_memory_command("?5 00", "203", "20F"), "204\n")
+
+    def test_search_memory_command_single_digit(self):
+        """Test that a single HEX digit is an exact byte and longer tokens are rejected."""
+        self.emulator.edit_memory("300", "15 25 05")
+        self.assertEqual(self.emulator.search_memory_command("5", "300", "302"), "302\n")
+        self.assertEqual(self.emulator.search_memory_command("? 05", "300", "302"), "301\n")
+        self.assertRaises(ValueError, self.emulator.search_memory_command, "A90")
+
+    def test_run_script(self):
+        """Test running monitor commands from a script."""
+        script = io.StringIO("300: EA 00\n\n300\n200.201\nexit\n200\n")
+        out = io.StringIO()
+        self.emulator.run_script(script, out)
+        self.assertEqual(out.getvalue(), "300\tEA\n200\tA9 00\n\n")
+
+    def test_run_program_max_steps(self):
+        """Test stopping a program that never reaches BRK."""
+        output = self.emulator.run_program("200", max_steps=3)
+        self.assertEqual(
+            output, " PC  OPC  INS   AMOD OPRND  AC XR YR SP NV-BDIZC\n" +
+            " 200  A9  LDA      # 00 --  00 00 00 FF 00100010\n" +
+            " 202  85  STA    zpg 00 --  00 00 00 FF 00100010\n" +
+            " 204  A5  LDA    zpg 00 --  00 00 00 FF 00100010\n")
+        self.assertEqual(self.emulator.steps, 3)
+
+    def test_run_program_no_trace(self):
+        """Test running a program without recording the trace."""
+        output = self.emulator.run_program("200", max_steps=100, trace=False)
+        self.assertEqual(output, "")
+        self.assertEqual(self.emulator.steps, 100)
+
+    def test_run_brk(self):
+        """Test the result of a run that reaches BRK."""
+        self.emulator.edit_memory("300", "A9 05 EA 00")
+        result = self.emulator.run(0x300)
+        self.assertEqual(result, emulator.RunResult(emulator.BRK, 3, 11, 0x304))
+
+    def test_run_until_pc(self):
+        """Test stopping a run when it reaches an address."""
+        result = self.emulator.run(0x200, until_pc=0x20B)
+        self.assertEqual(result.reason, emulator.UNTIL_PC)
+        self.assertEqual(result.pc, 0x20B)
+        self.assertEqual(result.steps, 5)
+
+    def test_run_max_cycles(self):
+        """Test stopping a run once it has used up its cycles."""
+        result = self.emulator.run(0x200, max_cycles=20)
+        self.assertEqual(result.reason, emulator.MAX_CYCLES)
+        self.assertGreaterEqual(result.cycles, 20)
+
+    def test_run_zero_budget(self):
+        """Test that a run with no steps or cycles to spend runs no instructions."""
+        self.emulator.edit_memory("300", "A9 05 00")
+        self.assertEqual(self.emulator.run(0x300, max_steps=0),
+                         emulator.RunResult(emulator.MAX_STEPS, 0, 0, 0x300))
+        self.assertEqual(self.emulator.run(0x300, max_cycles=0),
+                         emulator.RunResult(emulator.MAX_CYCLES, 0, 0, 0x300))
+        self.assertEqual(self.emulator.get_AC(), 0)
+
+    def test_run_timeout(self):
+        """Test stopping a run that never reaches BRK at its deadline."""
+        result = self.emulator.run(0x200, timeout=0)
+        self.assertEqual(result.reason, emulator.DEADLINE)
+        self.assertEqual(result.steps, emulator.CHECK_INTERVAL)
+
+    def test_run_unknown_opcode(self):
+        """Test stopping a run at an opcode the T34 does not implement."""
+        self.emulator.edit_memory("300", "EA FF")
+        result = self.emulator.run(0x300)
+        self.assertEqual(result, emulator.RunResult(emulator.UNKNOWN_OPCODE, 1, 2, 0x301))
+
+    def test_breakpoint(self):
+        """Test stopping a run at a breakpoint and continuing from it."""
+        self.emulator.edit_memory("300", "A9 05 85 10 EA EA 00")
+        self.emulator.set_breakpoint(0x305)
+        result = self.emulator.run(0x300)
+        self.assertEqual(result, emulator.RunResult(emulator.BREAKPOINT, 3, 7, 0x305))
+        self.assertEqual(self.emulator.run(0x305).reason, emulator.BRK)
+
+    def test_breakpoints_allocated_lazily(self):
+        """Test that the breakpoint bitmaps are only allocated once a breakpoint is set."""
+        self.assertIsNone(self.emulator.breakpoints)
+        self.assertIsNone(self.emulator.clone().watchpoints)
+        self.emulator.clear_breakpoints(0x300, 0x310)
+        self.assertEqual(self.emulator.list_breakpoints(), "")
+        self.emulator.set_watchpoint(0x10)
+        self.emulator.clear_breakpoints(0x10, 0x11)
+        self.assertEqual(self.emulator.watch_count, 0)
+        self.assertIsNone(self.emulator.breakpoints)
+
+    def test_conditional_breakpoint(self):
+        """Test stopping a loop only when a breakpoint's condition holds."""
+        self.emulator.edit_memory("300", "A2 00 E8 E0 10 D0 FB 00")
+        self.emulator.edit_memory("10", "07")
+        self.emulator.set_breakpoint(0x303, "X == 5 and mem[0x10] > 3")
+        result = self.emulator.run(0x300)
+        self.assertEqual((result.reason, result.pc), (emulator.BREAKPOINT, 0x303))
+        self.assertEqual(self.emulator.get_X(), 5)
+        self.assertEqual(self.emulator.list_breakpoints(), "BP 303 X == 5 and mem[0x10] > 3\n")
+        self.emulator.set_breakpoint(0x303)
+        self.assertEqual(self.emulator.run(0x303).pc, 0x303)
+        self.assertEqual(self.emulator.list_breakpoints(), "BP 303\n")
+
+    def test_watchpoint(self):
+        """Test stopping a run after an instruction reads or writes a watched address."""
+        self.emulator.edit_memory("300", "A9 05 85 10 A5 11 48 00")
+        self.emulator.set_watchpoint(0x10)
+        self.assertEqual(self.emulator.run(0x300).pc, 0x304)
+        self.assertEqual(self.emulator.watch_hit, ("W", 0x10))
+        self.emulator.set_watchpoint(0x11, kind="R")
+        self.assertEqual(self.emulator.run(0x304).pc, 0x306)
+        self.assertEqual(self.emulator.watch_hit, ("R", 0x11))
+        self.emulator.clear_breakpoints(0x10, 0x12)
+        self.emulator.set_watchpoint(0x1FF)
+        self.assertEqual(self.emulator.run(0x306).reason, emulator.WATCHPOINT)
+        self.emulator.clear_breakpoints()
+        self.assertNotIn("read_memory", vars(self.emulator))
+        self.assertNotIn("mark_dirty", vars(self.emulator))
+
+    def test_read_watchpoint_on_code(self):
+        """Test that fetching an instruction does not trip a read watchpoint on its bytes."""
+        self.emulator.edit_memory("300", "A9 05 EA AD 08 03 EA EA 00")
+        self.emulator.set_watchpoint(0x300, 0x309, "R")
+        result = self.emulator.run(0x300)
+        self.assertEqual((result.reason, result.pc), (emulator.WATCHPOINT, 0x306))
+        self.assertEqual(self.emulator.watch_hit, ("R", 0x308))
+        self.assertEqual(self.emulator.run(0x306).reason, emulator.BRK)
+
+    def test_breakpoint_commands(self):
+        """Test setting, listing, clearing and stopping at breakpoints from the monitor."""
+        self.emulator.edit_memory("300", "A9 05 85 10 EA EA 00")
+        script = io.StringIO("BP 305\nWP 10.11 RW\nWP 20\nBP\nCP 11\nWP\nCP 10.20\n300R\nR\n")
+        out = io.StringIO()
+        self.emulator.run_script(script, out)
+        lines = out.getvalue().splitlines()
+        self.assertEqual(lines[:6], ["BP 305", "WP 10.11 RW", "WP 20 W", "BP 305", "WP 10 RW", "WP 20 W"])
+        self.assertEqual(lines[10:13], ["", "Breakpoint at 305", lines[6]])
+        self.assertEqual(lines[13][:9], " 305  EA ")
+        self.assertEqual(self.emulator.stop.reason, emulator.BRK)
+
+    def test_reverse_commands(self):
+        """Test stepping back and running backwards to a breakpoint from the monitor."""
+        self.emulator.edit_memory("300", "A9 05 85 10 E6 10 E6 10 00")
+        script = io.StringIO("HI 100\n300R\nHI\nSB 2\n10\nBP 304\nRC\n10\nSB 5\n")
+        out = io.StringIO()
+        self.emulator.run_script(script, out)
+        lines = out.getvalue().splitlines()
+        self.assertEqual(lines[-5:], ["5 of 100", "10\t06", "Breakpoint at 304", "10\t05",
+                                      "Start of history at 300"])
+        self.assertEqual(self.emulator.stop.pc, 0x300)
+        self.assertEqual(self.emulator.get_AC(), 0)
+
+    def test_flight_recorder(self):
+        """Test dumping the last instructions when a run stops or fails."""
+        out = io.StringIO()
+        self.emulator.record_flight(2, out)
+        self.emulator.run(0x200, max_steps=10)
+        self.assertEqual(out.getvalue().splitlines()[:4], [
+            "Flight recorder: max_steps at 204, last 2 instructions",
+            " PC  OPC  INS   AMOD OPRND  AC XR YR SP NV-BDIZC",
+            " 209  E6  INC    zpg 00 --  01 00 00 FF 00100000",
+            " 20B  4C  JMP    abs 04 02  01 00 00 FF 00100000"])
+        self.emulator.run(0x200, until_pc=0x206)
+        self.assertEqual(len(out.getvalue().splitlines()), 4)
+
+        self.emulator.edit_memory("300", "E5 10")
+        with self.assertRaises(TypeError):
+            self.emulator.run(0x300)
+        self.assertTrue(out.getvalue().splitlines()[4].startswith("Flight recorder: TypeError"))
+
+    def test_coverage_commands(self):
+        """Test recording and reporting coverage from the monitor."""
+        self.emulator.edit_memory("300", "A9 05 D0 01 EA 00")
+        script = io.StringIO("CV ON\n300R\nCV 300.305\nCV OFF\nCV\n")
+        out = io.StringIO()
+        self.emulator.run_script(script, out)
+        self.assertEqual(out.getvalue().splitlines()[-1], "300.305\t3 instructions, 5 of 6 bytes (83.3%)")
+        self.assertIsNone(self.emulator.coverage)
+
+    def test_profile_commands(self):
+        """Test profiling subroutines from the monitor and writing folded stacks."""
+        self.emulator.edit_memory("300", "20 10 03 20 10 03 00")
+        self.emulator.edit_memory("310", "20 20 03 60")
+        self.emulator.edit_memory("320", "EA 60")
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "profile.folded")
+            script = io.StringIO("PF STEPS\n300R\nPF\nPF %s\nPF OFF\n" % path)
+            out = io.StringIO()
+            self.emulator.run_script(script, out)
+            with open(path) as folded:
+                self.assertEqual(folded.read(), "0300 3\n0300;0310 4\n0300;0310;0320 4\n")
+        self.assertIn("0310                        8            4        2",
+                      out.getvalue().splitlines())
+        self.assertIsNone(self.emulator.profiler)
+
+    def test_symbol_commands(self):
+        """Test naming addresses in traces, profiles and messages by their labels."""
+        self.emulator.edit_memory("300", "20 10 03 00")
+        self.emulator.edit_memory("310", "EA 60")
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "symbols.txt")
+            with open(path, "w") as symbol_file:
+                symbol_file.write("start = $300\nsub = $310\n")
+            script = io.StringIO("SY %s\nPF STEPS\nBP sub+1\nstartR\nR\nPF\n" % path)
+            out = io.StringIO()
+            self.emulator.run_script(script, out)
+        lines = out.getvalue().splitlines()
+        self.assertEqual(lines[1], " 300  20  JSR    abs 10 03  00 00 00 FD 00100000  start")
+        self.assertIn("Breakpoint at 311 (sub+1)", lines)
+        self.assertEqual(lines[-1], "sub                         2            2        1")
+
+    def test_reset(self):
+        """Test that a reset emulator runs like a new one."""
+        expected = Emulator().run_program("300")
+        self.emulator.run_program("200", max_steps=10)
+        self.emulator.reset()
+        self.assertIsNone(self.emulator.stop)
+        self.assertEqual(self.emulator.run_program("300"), expected)
+
+    def test_instructions_shared(self):
+        """Test that the dispatch table is shared rather than built per emulator."""
+        self.assertIs(self.emulator.instructions, Emulator().instructions)
+
+    def test_pickle(self):
+        """Test that a pickled emulator keeps its state and still runs."""
+        self.emulator.take_snapshot()
+        emulator = pickle.loads(pickle.dumps(self.emulator))
+        self.assertEqual(emulator.memory, self.emulator.memory)
+        self.assertEqual(emulator.program, "test.txt")
+        self.assertIsNone(emulator.baseline)
+        self.assertEqual(emulator.run_program("200", max_steps=3),
+                         self.emulator.run_program("200", max_steps=3))
+
+    def test_clone(self):
+        """Test that a cloned emulator runs independently."""
+        emulator = self.emulator.clone()
+        emulator.run_program("200", max_steps=3)
+        self.assertEqual(self.emulator.steps, 0)
+        self.assertEqual(self.emulator.get_PC(), 0)
+        self.assertEqual(emulator.get_PC(), 0x205)
+
+    @unittest.skipUnless(hasattr(os, "fork"), "needs os.fork")
+    def test_fork_explore(self):
+        """Test running patched variants in forked children."""
+        self.emulator.edit_memory("300", "A5 10 65 11 00")
+        variants = [emulator.Variant(0x300, ((0x10, b"\x01"), (0x11, b"\x02"))),
+                    emulator.Variant("300", ((0x10, b"\x7F"),), {"SR": 0x21}),
+                    emulator.Variant(0x200)]
+        results = self.emulator.fork_explore(variants, workers=2, max_steps=100)
+        self.assertEqual([result.registers[2] for result in results[:2]], [0x03, 0x80])
+        self.assertEqual(results[2].reason, emulator.MAX_STEPS)
+        self.assertEqual(self.emulator.memory[0x10:0x12], bytes(2))
+
+    @unittest.skipUnless(hasattr(os, "fork"), "needs os.fork")
+    def test_fork_explore_error(self):
+        """Test that a variant raising in its child ends with an error and the others still run."""
+        self.emulator.edit_memory("300", "EA 00")
+        self.emulator.edit_memory("310", "E5 10 00")
+        results = self.emulator.fork_explore([emulator.Variant("300"), emulator.Variant("310"),
+                                              emulator.Variant("XYZ")], workers=2)
+        self.assertEqual([result.reason for result in results],
+                         [emulator.BRK, emulator.ERROR, emulator.ERROR])
+        self.assertIsNone(results[0].error)
+        self.assertTrue(results[1].error.startswith("TypeError"))
+        self.assertEqual((results[1].steps, results[1].pc), (0, 0x310))
+        self.assertTrue(results[2].error.startswith("ValueError"))
+        self.assertIsNone(results[2].pc)
+
+    def test_sweep(self):
+        """Test running one image over many inputs and restoring it after every run."""
+        self.emulator.edit_memory("300", "A5 10 65 11 85 12 48 00")
+        self.emulator.snapshot()
+        self.emulator.edit_memory("11", "01")
+        image = bytes(self.emulator.memory)
+        registers = bytes(self.emulator.registers)
+        inputs = [emulator.SweepInput(((0x10, b"\x02"),)),
+                  emulator.SweepInput(((0x10, b"\x7F"),), {"SR": 0x21}),
+                  emulator.SweepInput()]
+        sweep = self.emulator.sweep("300", inputs, [0x12, (0x1FC, 0x1FD)], max_steps=100)
+        self.assertEqual(sweep.width, 2)
+        self.assertEqual(sweep.data, bytes([0x03, 0x34, 0x81, 0xF4, 0x01, 0x34]))
+        self.assertEqual([result.reason for result in sweep.results], [emulator.BRK] * 3)
+        self.assertEqual(bytes(self.emulator.memory), image)
+        self.assertEqual(bytes(self.emulator.registers), registers)
+        self.assertEqual(self.emulator.dirty_pages(), [0])
+
+    def test_save_program(self):
+        """Test saving memory and loading it into a new emulator."""
+        self.emulator.edit_memory("1000", "01 02 03")
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "saved.hex")
+            self.emulator.save_program(path)
+            emulator = Emulator(path)
+        self.assertEqual(emulator.memory, self.emulator.memory)
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,46 @@
+"""
+.. module:: TestHistory
+"""
+import unittest
+from t34 import History
+from t34.Emulator import Emulator
+
+
+class TestHistory(unittest.TestCase):
+    """Unit testing class for the instruction history in the History module."""
+
+    def setUp(self):
+        self.emulator = Emulator()
+        self.emulator.edit_memory("300", "A9 05 85 10 48 20 0A 03 00 00 EE 10 00 60")
+        self.emulator.edit_memory("10", "AA")
+
+    def test_undo(self):
+        """Test undoing every instruction of a run, stack writes included."""
+        states = []
+        history = History.History(100)
+        pc = 0x300
+        for _ in range(6):
+            states.append((bytes(self.emulator.memory), bytes(self.emulator.registers)))
+            history.record(self.emulator, pc)
+            self.emulator.execute_instruction(pc, False)
+            pc = self.emulator.get_PC() + 1
+        self.assertEqual(self.emulator.memory[0x10], 0x06)
+        for memory, registers in reversed(states):
+            history.undo(self.emulator)
+            self.assertEqual(bytes(self.emulator.memory), memory)
+            self.assertEqual(bytes(self.emulator.registers), registers)
+        self.assertIsNone(history.undo(self.emulator))
+
+    def test_capacity(self):
+        """Test that a full history keeps only the latest instructions."""
+        history = History.History(2)
+        self.emulator.history = history
+        self.emulator.run(0x300)
+        self.assertEqual(len(history), 2)
+        self.assertEqual(history.undo(self.emulator), 0x308)
+        self.assertEqual(history.undo(self.emulator), 0x30D)
+        self.assertIsNone(history.undo(self.emulator))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,99 @@
+"""
+.. module:: TestLoader
+"""
+import os
+import tempfile
+import unittest
+import t34
+from t34 import Loader
+from t34.Memory import Memory
+
+
+class TestLoader(unittest.TestCase):
+    """Unit testing class for the program loaders in the Loader module."""
+
+    def setUp(self):
+        """Setup the Memory object to be loaded by all the tests."""
+        self.memory = Memory()
+        self.directory = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def write_file(self, name, data):
+        """Writes a file into the temporary directory and returns its path."""
+        path = os.path.join(self.directory.name, name)
+        with open(path, "wb" if isinstance(data, bytes) else "w") as f:
+            f.write(data)
+        return path
+
+    def test_load_hex(self):
+        """Test loading an Intel HEX file."""
+        Loader.load_hex(self.memory, "test.txt")
+        self.assertEqual(self.memory.memory[0x200:0x20E].hex().upper(),
+                         "A9008500A5008D0080E6004C0402")
+        self.assertEqual(self.memory.memory[0x20E], 0)
+        self.assertEqual(self.memory.dirty_pages(), [0x02])
+
+    def test_load_hex_extended_address(self):
+        """Test an extended segment address record moving the data."""
+        path = self.write_file("segment.hex", ":020000020010EC\n:0100000042BD\n:00000001FF\n")
+        Loader.load_hex(self.memory, path)
+        self.assertEqual(self.memory.memory[0x100], 0x42)
+
+    def test_load_hex_bad_checksum(self):
+        """Test that a record with a bad checksum is rejected."""
+        path = self.write_file("bad.hex", ":0100000042BE\n:00000001FF\n")
+        with self.assertRaises(ValueError):
+            Loader.load_hex(self.memory, path)
+
+    def test_load_hex_bad_length(self):
+        """Test that a truncated record is rejected."""
+        path = self.write_file("short.hex", ":0200000042BC\n")
+        with self.assertRaises(ValueError):
+            Loader.load_hex(self.memory, path)
+
+    def test_load_bin(self):
+        """Test loading a raw binary image at a load address."""
+        path = self.write_file("program.bin", bytes([0xA9, 0x01, 0x00]))
+        Loader.load_bin(self.memory, path, 0x300)
+        self.assertEqual(self.memory.memory[0x2FF:0x304], bytes([0, 0xA9, 0x01, 0x00, 0]))
+        self.assertEqual(self.memory.dirty_pages(), [0x03])
+
+    def test_load_bin_too_large(self):
+        """Test that an image running past the end of memory is rejected."""
+        path = self.write_file("program.bin", bytes(4))
+        with self.assertRaises(ValueError):
+            Loader.load_bin(self.memory, path, 0xFFFE)
+
+    def test_load_prg(self):
+        """Test loading a PRG image at the address in its header."""
+        path = self.write_file("program.prg", bytes([0x01, 0x08, 0xEA, 0x00]))
+        Loader.load(self.memory, path)
+        self.assertEqual(self.memory.memory[0x801:0x803], bytes([0xEA, 0x00]))
+
+    def test_find_segments(self):
+        """Test finding the non-zero segments of memory."""
+        self.memory.memory[0x2F0:0x310] = bytes(range(1, 33))
+        self.memory.memory[0x305] = 0
+        self.memory.memory[0xFFFF] = 1
+        self.assertEqual(Loader.find_segments(self.memory), [(0x2F0, 0x310), (0xFFFF, 0x10000)])
+        self.assertEqual(Loader.find_segments(self.memory, [0xFF]), [(0xFFFF, 0x10000)])
+
+    def test_save_hex(self):
+        """Test that saved memory loads back unchanged."""
+        self.memory.memory[0x2F0:0x350] = bytes(range(1, 0x61))
+        path = os.path.join(self.directory.name, "saved.hex")
+        Loader.save_hex(self.memory, path, [(0x2F0, 0x350)])
+        with open(path) as f:
+            lines = f.read().splitlines()
+        self.assertEqual(len(lines), 4)
+        self.assertEqual(lines[-1], ":00000001FF")
+
+        memory = Memory()
+        Loader.load_hex(memory, path)
+        self.assertEqual(memory.memory, self.memory.memory)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,88 @@
+"""
+.. module:: TestLockstep
+"""
+import random
+import unittest
+from t34 import Emulator as emulator
+from t34.Emulator import Emulator
+from t34.Instructions import Instructions
+try:
+    import numpy as np
+    from t34 import Lockstep
+except ImportError:
+    np = None
+
+
+@unittest.skipIf(np is None, "needs numpy")
+class TestLockstep(unittest.TestCase):
+    """Unit testing class for the NumPy lockstep engine in the Lockstep module."""
+
+    def setUp(self):
+        self.emulator = Emulator()
+        self.emulator.edit_memory("300", "A5 10 65 11 85 12 00")
+
+    def test_run(self):
+        """Test that every instance runs its own data through the same program."""
+        machines = Lockstep.Lockstep(self.emulator, 3)
+        machines.memory[:, 0x10] = [1, 0x7F, 0xFF]
+        machines.memory[:, 0x11] = [2, 1, 1]
+        self.assertEqual(machines.run(0x300), {emulator.BRK: 3})
+        self.assertEqual(list(machines.memory[:, 0x12]), [3, 0x80, 0])
+        self.assertEqual(list(machines.steps), [4, 4, 4])
+        self.assertEqual(machines.get_registers(1)["SR"] & 0xC0, 0xC0)
+        self.assertEqual(self.emulator.memory[0x12], 0)
+
+    def test_split(self):
+        """Test that instances whose branches diverge split and stop on their own."""
+        self.emulator.edit_memory("300", "A6 10 CA D0 FD 00")
+        machines = Lockstep.Lockstep(self.emulator, 3)
+        machines.memory[:, 0x10] = [1, 3, 200]
+        self.assertEqual(machines.run(0x300, max_steps=50),
+                         {emulator.MAX_STEPS: 1, emulator.UNKNOWN_OPCODE: 2})
+        self.assertEqual(list(machines.steps), [3, 7, 50])
+        self.assertEqual(machines.get_reason(0), emulator.UNKNOWN_OPCODE)
+
+    def test_error(self):
+        """Test that an instance stops where the Emulator would raise."""
+        self.emulator.edit_memory("300", "38 E9 05 00")
+        machines = Lockstep.Lockstep(self.emulator, 2)
+        machines.set_register("AC", [2, 9])
+        machines.run(0x300)
+        self.assertEqual(machines.get_reason(0), Lockstep.ERROR)
+        self.assertEqual(machines.get_reason(1), emulator.BRK)
+        self.assertEqual(machines.get_registers(1)["AC"], 5)
+
+    def test_matches_emulator(self):
+        """Test every opcode on random states against the Emulator."""
+        rng = random.Random(34)
+        count = 16
+        for op in Instructions.instructions:
+            states = []
+            for _ in range(count):
+                em = Emulator()
+                em.memory[0:0x200] = bytes(rng.randrange(256) for _ in range(0x200))
+                em.memory[0x300:0x303] = bytes([int(op, 16), rng.randrange(256), rng.randrange(2)])
+                em.set_registers({"PC": 0, "AC": rng.randrange(256), "X": rng.randrange(256),
+                                  "Y": rng.randrange(256), "SP": rng.choice([1, 2, 0xFF, rng.randrange(256)]),
+                                  "SR": rng.randrange(256)})
+                states.append(em)
+
+            machines = Lockstep.Lockstep(self.emulator, count)
+            for index, em in enumerate(states):
+                machines.memory[index] = np.frombuffer(bytes(em.memory), dtype=np.uint8)
+                machines.set_registers(index, em.get_registers())
+            machines.run(0x300, max_steps=1)
+
+            for index, em in enumerate(states):
+                try:
+                    result = em.run(0x300, max_steps=1)
+                except Exception:
+                    self.assertEqual(machines.get_reason(index), Lockstep.ERROR, op)
+                    continue
+                self.assertEqual(machines.get_reason(index), result.reason, op)
+                self.assertEqual(machines.get_registers(index), em.get_registers(), op)
+                self.assertEqual(machines.memory[index].tobytes(), bytes(em.memory), op)
+
+
+if __name__ == '__main__':
+    unittest.main()
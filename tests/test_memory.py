@@ -84,3 +84,104 @@ class TestMemory(unittest.TestCase):
         value = 20
         self.memory.registers[6:7] = value.to_bytes(1, byteorder='big')
         self.assertEqual(self.memory.get_SR(), value)
+
+    def test_dirty_pages_write_memory(self):
+        """Test that writes mark their pages dirty."""
+        self.assertEqual(self.memory.dirty_pages(), [])
+        self.memory.write_memory("300", 5)
+        self.memory.write_memory(0x10FF, bytearray([1, 2]))
+        self.assertEqual(self.memory.dirty_pages(), [0x03, 0x10, 0x11])
+        self.assertTrue(self.memory.page_isDirty(0x10))
+        self.assertFalse(self.memory.page_isDirty(0x04))
+
+    def test_dirty_pages_stack(self):
+        """Test that stack pushes mark the stack page dirty."""
+        self.memory.write_SP(0xFD)
+        self.memory.push_to_stack(0x0302, 2)
+        self.assertEqual(self.memory.dirty_pages(), [0x01])
+
+    def test_clear_dirty(self):
+        """Test clearing the dirty-page bitmap."""
+        self.memory.write_memory(0xFFFF, 1)
+        self.assertEqual(self.memory.dirty_pages(), [0xFF])
+        self.memory.clear_dirty()
+        self.assertEqual(self.memory.dirty_pages(), [])
+
+    def test_diff_memory(self):
+        """Test diffing two memory images into runs of changes."""
+        old = self.memory.snapshot()
+        self.memory.write_memory(0x300, bytearray([1, 2, 3]))
+        self.memory.write_memory(0x3FF, bytearray([4, 5]))
+        self.memory.write_memory(0x1000, 7)
+        runs = self.memory.diff_memory(old, pages=self.memory.dirty_pages())
+        self.assertEqual(runs, [(0x300, b"\x00\x00\x00", b"\x01\x02\x03"),
+                                (0x3FF, b"\x00\x00", b"\x04\x05"),
+                                (0x1000, b"\x00", b"\x07")])
+        self.assertEqual(self.memory.diff_memory(old), runs)
+
+    def test_search_memory(self):
+        """Test finding every match of an exact pattern."""
+        self.memory.write_memory(0x300, bytearray([0xAA, 0xAA, 0xAA]))
+        self.memory.write_memory(0xFFFE, bytearray([0xAA, 0xAA]))
+        self.assertEqual(self.memory.search_memory(b"\xAA\xAA"), [0x300, 0x301, 0xFFFE])
+        self.assertEqual(self.memory.search_memory(b"\xAA\xAA", start=0x301, end=0x303), [0x301])
+
+    def test_search_memory_mask(self):
+        """Test finding a pattern that only compares masked bits."""
+        self.memory.write_memory(0x300, bytearray([0xA9, 0x10, 0x8D]))
+        self.memory.write_memory(0x400, bytearray([0xA9, 0x2E, 0x8D]))
+        self.memory.write_memory(0xFFFD, bytearray([0xA9, 0x00, 0x8D]))
+        self.assertEqual(self.memory.search_memory(b"\xA9\x00\x8D", b"\xFF\x00\xFF"),
+                         [0x300, 0x400, 0xFFFD])
+        self.assertEqual(self.memory.search_memory(b"\xA9\x20\x8D", b"\xFF\xF0\xFF"), [0x400])
+
+    def test_fill_memory(self):
+        """Test filling a range with a repeated pattern."""
+        self.memory.fill_memory(0x1000, 0x1005, b"\x01\x02")
+        self.assertEqual(self.memory.memory[0xFFF:0x1006], b"\x00\x01\x02\x01\x02\x01\x00")
+        self.assertEqual(self.memory.dirty_pages(), [0x10])
+        with self.assertRaises(ValueError):
+            self.memory.fill_memory(0xFFFF, 0x10001, b"\x01")
+
+    def test_move_memory_overlapping(self):
+        """Test moving a block onto an overlapping range in both directions."""
+        self.memory.write_memory(0x300, bytearray([1, 2, 3, 4]))
+        self.memory.move_memory(0x302, 0x300, 0x304)
+        self.assertEqual(self.memory.memory[0x300:0x306], bytes([1, 2, 1, 2, 3, 4]))
+        self.memory.move_memory(0x300, 0x302, 0x306)
+        self.assertEqual(self.memory.memory[0x300:0x306], bytes([1, 2, 3, 4, 3, 4]))
+        with self.assertRaises(ValueError):
+            self.memory.move_memory(0xFFFE, 0x300, 0x304)
+
+    def test_reset(self):
+        """Test resetting registers and memory in place."""
+        memory = self.memory.memory
+        self.memory.write_memory(0x300, bytearray([1, 2, 3]))
+        self.memory.write_AC(5)
+        self.memory.write_SP(0x80)
+        self.memory.reset()
+        self.assertIs(self.memory.memory, memory)
+        self.assertEqual(self.memory.memory[0x300:0x303], bytes(3))
+        self.assertEqual(self.memory.get_registers(),
+                         {"PC": 0, "AC": 0, "X": 0, "Y": 0, "SP": 0xFF, "SR": 0x20})
+        self.assertEqual(self.memory.dirty_pages(), [])
+
+    def test_reset_ranges(self):
+        """Test resetting only some ranges of memory."""
+        self.memory.write_memory(0x300, bytearray([1, 2, 3]))
+        self.memory.reset([(0x301, 0x302)])
+        self.assertEqual(self.memory.memory[0x300:0x303], bytes([1, 0, 3]))
+        self.memory.reset(False)
+        self.assertEqual(self.memory.memory[0x300:0x303], bytes([1, 0, 3]))
+
+    def test_clone(self):
+        """Test that a clone copies the state without sharing it."""
+        self.memory.write_memory(0x300, 7)
+        self.memory.write_AC(5)
+        other = self.memory.clone()
+        self.assertEqual(other.memory, self.memory.memory)
+        self.assertEqual(other.get_AC(), 5)
+        other.write_memory(0x300, 8)
+        other.write_AC(6)
+        self.assertEqual(self.memory.memory[0x300], 7)
+        self.assertEqual(self.memory.get_AC(), 5)
@@ -0,0 +1,55 @@
+"""
+.. module:: TestProfiler
+"""
+import unittest
+from t34 import Profiler
+from t34.Emulator import Emulator
+
+
+class TestProfiler(unittest.TestCase):
+    """Unit testing class for the call-graph profiler in the Profiler module."""
+
+    def setUp(self):
+        self.emulator = Emulator()
+        self.emulator.edit_memory("300", "20 10 03 00")
+        self.emulator.edit_memory("310", "20 10 03 60")
+
+    def record(self, profiler, *pcs):
+        """Charges the instructions at the addresses to the profile, 2 cycles each."""
+        for pc in pcs:
+            profiler.record(self.emulator, pc, 2)
+
+    def test_folded(self):
+        """Test charging instructions to the call path of every JSR and RTS."""
+        profiler = Profiler.Profiler(Profiler.STEPS)
+        self.record(profiler, 0x300, 0x313, 0x303)
+        self.assertEqual("".join(profiler.folded()), "0300 2\n0300;0310 1\n")
+
+    def test_recursion(self):
+        """Test that recursive calls count once in the inclusive total."""
+        profiler = Profiler.Profiler(Profiler.CYCLES)
+        self.record(profiler, 0x300, 0x310, 0x313, 0x313, 0x303)
+        self.assertEqual(list(profiler.folded("S{:X}".format)),
+                         ["S300 4\n", "S300;S310 4\n", "S300;S310;S310 2\n"])
+        self.assertEqual(profiler.subroutines(), {0x300: (10, 4, 0), 0x310: (6, 6, 2)})
+
+    def test_return_from_root(self):
+        """Test that an RTS without a JSR stays in the outermost call path."""
+        profiler = Profiler.Profiler(Profiler.STEPS)
+        self.record(profiler, 0x313, 0x313)
+        self.assertEqual("".join(profiler.folded()), "0313 2\n")
+
+    def test_unwind(self):
+        """Test that an unwound profile starts a new call path and adds to the old ones."""
+        profiler = Profiler.Profiler(Profiler.STEPS)
+        self.record(profiler, 0x300)
+        profiler.unwind()
+        self.record(profiler, 0x300, 0x313)
+        profiler.unwind()
+        self.record(profiler, 0x303)
+        self.assertEqual("".join(profiler.folded()), "0300 2\n0300;0310 1\n0303 1\n")
+        self.assertEqual(profiler.subroutines()[0x310], (1, 1, 2))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,36 @@
+"""
+.. module:: TestRecorder
+"""
+import io
+import unittest
+from t34 import Recorder
+from t34.Emulator import Emulator
+
+
+class TestRecorder(unittest.TestCase):
+    """Unit testing class for the flight recorder in the Recorder module."""
+
+    def setUp(self):
+        self.emulator = Emulator()
+        self.emulator.edit_memory("300", "A9 05 85 10 E6 10 AD 10 00 4C 0E 03 00 00 6C 10 00 00")
+
+    def test_lines_match_trace(self):
+        """Test that recorded instructions format like the trace of a run."""
+        recorder = Recorder.FlightRecorder(100, io.StringIO())
+        self.emulator.recorder = recorder
+        trace = self.emulator.clone().run_program("300")
+        self.emulator.run(0x300)
+        self.assertEqual(Recorder.HEADER + "".join(recorder.lines(self.emulator)), trace)
+
+    def test_capacity(self):
+        """Test that a full recorder keeps only the latest instructions."""
+        recorder = Recorder.FlightRecorder(2, io.StringIO())
+        self.emulator.recorder = recorder
+        self.emulator.run(0x300)
+        lines = list(recorder.lines(self.emulator))
+        self.assertEqual(len(lines), 2)
+        self.assertEqual([line[:9] for line in lines], [" 30E  6C ", "   6  00 "])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,52 @@
+"""
+.. module:: TestSymbols
+"""
+import unittest
+from t34 import Symbols
+
+LINES = [
+    "; labels\n",
+    "start = $0300\n",
+    "counter EQU $10  ; loop counter\n",
+    "0310  20 20 03  sub:   JSR inner\n",
+    "0313  60               RTS\n",
+    "0320  EA        inner  NOP\n",
+    "        .org $0400\n",
+    "0400  AD 00 03  .data  LDA start\n",
+]
+
+
+class TestSymbols(unittest.TestCase):
+    """Unit testing class for the symbol tables in the Symbols module."""
+
+    def setUp(self):
+        self.symbols = Symbols.SymbolTable(Symbols.parse(LINES))
+
+    def test_parse(self):
+        """Test reading assignments and the labels of an assembler listing."""
+        self.assertEqual(list(Symbols.parse(LINES)),
+                         [("start", 0x300), ("counter", 0x10), ("sub", 0x310), ("inner", 0x320)])
+
+    def test_name(self):
+        """Test naming addresses by the nearest label at or before them."""
+        self.assertEqual([self.symbols.name(address) for address in (0x8, 0x10, 0x300, 0x312, 0x400)],
+                         ["0008", "counter", "start", "sub+2", "inner+E0"])
+        self.assertEqual(self.symbols.lookup(0x312), ("sub", 2))
+        self.assertIsNone(self.symbols.lookup(0xF))
+
+    def test_first_label_names_address(self):
+        """Test that the first of several labels at one address names it."""
+        symbols = Symbols.SymbolTable([("main", 0x300), ("start", 0x300)])
+        self.assertEqual(symbols.name(0x301), "main+1")
+        self.assertEqual(symbols.address("start"), 0x300)
+
+    def test_address(self):
+        """Test reading labels, ignoring case, and HEX addresses."""
+        self.assertEqual(self.symbols.address("SUB"), 0x310)
+        self.assertEqual(self.symbols.address("sub+1A"), 0x32A)
+        self.assertEqual(self.symbols.address("1234"), 0x1234)
+        self.assertRaises(ValueError, self.symbols.address, "nowhere")
+
+
+if __name__ == '__main__':
+    unittest.main()